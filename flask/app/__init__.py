@@ -24,6 +24,7 @@ def create_app():
     from app.routes.finance_question import finance_bp
     from app.routes.chatbot import chatbot_bp
     from app.routes.recommendations import recommendations_bp
+    from app.routes.ratings_routes import ratings_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(stock_bp)
@@ -32,6 +33,11 @@ def create_app():
     app.register_blueprint(finance_bp)
     app.register_blueprint(recommendations_bp)
     app.register_blueprint(chatbot_bp)
+    app.register_blueprint(ratings_bp)
+
+    # Load the default forecasting model once, before the first request
+    from app.services.model_registry import model_registry
+    model_registry.warm(model_registry.default_version)
 
     # Serve frontend
     @app.route('/')
@@ -0,0 +1,98 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The flask/ folder
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Directory holding the model checkpoints, scalers and metadata
+MODEL_DIR = os.getenv("MODEL_DIR", BASE_DIR)
+
+# Directory for locally persisted data (forecasts, prices, ...)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+# Checkpoint, scaler and metadata files for every servable model version
+MODEL_VERSIONS = {
+    "bilstm_model": {
+        "model": "bilstm_model.pth",
+        "scaler": "scaler.joblib",
+        "metadata": "model_metadata.pkl",
+    },
+    "bilstm_stock_model": {
+        "model": "bilstm_stock_model.pth",
+        "scaler": "scaler_diff.pkl",
+        "metadata": "model_metadata.pkl",
+    },
+    "bilstm_stock_model_new": {
+        "model": "bilstm_stock_model_new.pth",
+        "scaler": "scaler_diff.pkl",
+        "metadata": "model_metadata.pkl",
+    },
+}
+
+# Version served when a request doesn't ask for one
+DEFAULT_MODEL_VERSION = os.getenv("DEFAULT_MODEL_VERSION", "bilstm_stock_model_new")
+
+# How the BiLSTM is run: "eager" (fp32 PyTorch), "torchscript" or "int8" (dynamically quantized)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+
+# Largest relative deviation from the eager model's forecasts a backend may show
+INFERENCE_TOLERANCE = float(os.getenv("INFERENCE_TOLERANCE", "0.01"))
+
+# Seconds between checks of the model files' mtimes for hot reloads
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+# On-disk forecast store and the number of forecasts kept in memory in front of it
+FORECAST_STORE_DIR = os.getenv("FORECAST_STORE_DIR", os.path.join(DATA_DIR, "forecasts"))
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "256"))
+
+# Seconds after which forecasts no request has rewritten are deleted from the store
+FORECAST_STORE_MAX_AGE = float(os.getenv("FORECAST_STORE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Worker threads running background forecast jobs, and how long finished jobs are kept (seconds)
+FORECAST_JOB_WORKERS = int(os.getenv("FORECAST_JOB_WORKERS", "4"))
+FORECAST_JOB_TTL = float(os.getenv("FORECAST_JOB_TTL", "3600"))
+
+# Seconds Ticker.info fundamentals are served as fresh, and served stale while they refresh in the background
+FUNDAMENTALS_TTL = float(os.getenv("FUNDAMENTALS_TTL", "3600"))
+FUNDAMENTALS_MAX_STALE = float(os.getenv("FUNDAMENTALS_MAX_STALE", "86400"))
+
+# Symbols whose fundamentals are kept in memory, and the threads refreshing stale ones
+FUNDAMENTALS_CACHE_SIZE = int(os.getenv("FUNDAMENTALS_CACHE_SIZE", "2048"))
+FUNDAMENTALS_REFRESH_WORKERS = int(os.getenv("FUNDAMENTALS_REFRESH_WORKERS", "4"))
+
+# Upstream calls per second and burst size per host
+SMARTAPI_RATE_LIMIT = float(os.getenv("SMARTAPI_RATE_LIMIT", "1"))
+SMARTAPI_BURST = float(os.getenv("SMARTAPI_BURST", "3"))
+YAHOO_RATE_LIMIT = float(os.getenv("YAHOO_RATE_LIMIT", "5"))
+YAHOO_BURST = float(os.getenv("YAHOO_BURST", "20"))
+
+# Retries of a failed upstream call, with jittered exponential backoff between them (seconds)
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_CAP = float(os.getenv("UPSTREAM_BACKOFF_CAP", "8"))
+
+# Failures in a row that open a host's circuit breaker, and seconds before it lets a trial call through
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "5"))
+UPSTREAM_RESET_TIMEOUT = float(os.getenv("UPSTREAM_RESET_TIMEOUT", "30"))
+
+# Longest a call waits for a rate-limit slot before failing (seconds)
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "10"))
+
+# Concurrent Yahoo Finance requests of the bulk holdings fetch (and connections kept alive for them)
+MARKET_DATA_WORKERS = int(os.getenv("MARKET_DATA_WORKERS", "8"))
+
+# Local OHLCV store and the seconds its bars are served before new ones are fetched
+OHLCV_STORE_DIR = os.getenv("OHLCV_STORE_DIR", os.path.join(DATA_DIR, "ohlcv"))
+OHLCV_REFRESH_INTERVAL = float(os.getenv("OHLCV_REFRESH_INTERVAL", "900"))
+
+# Source of market data and of broker holdings/orders: "live" (Yahoo Finance, SmartAPI) or
+# "replay" (recorded or synthetic responses, for load tests and offline development)
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "live")
+BROKER_PROVIDER = os.getenv("BROKER_PROVIDER", "live")
+
+# Recorded responses served by the replay providers, and their simulated latency plus random jitter (seconds)
+REPLAY_DIR = os.getenv("REPLAY_DIR", os.path.join(DATA_DIR, "replay"))
+REPLAY_LATENCY = float(os.getenv("REPLAY_LATENCY", "0.05"))
+REPLAY_LATENCY_JITTER = float(os.getenv("REPLAY_LATENCY_JITTER", "0.02"))
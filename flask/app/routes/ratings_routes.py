@@ -0,0 +1,57 @@
+from flask import Blueprint, jsonify, request
+import logging
+
+from app.routes.stock_routes import parse_tickers
+from app.services.model_registry import model_registry
+from app.services.ratings import get_stock_ratings
+
+ratings_bp = Blueprint('ratings', __name__, url_prefix='/api')
+
+# Most tickers a single ratings request may ask for
+MAX_RATING_TICKERS = 500
+
+
+@ratings_bp.route('/ratings', methods=['GET', 'POST'])
+def ratings():
+    """
+    Risk level and 1-5 star rating of every ticker.
+
+    Tickers come as ?tickers=AAPL,MSFT or as {"tickers": [...]} in a POST body.
+    Pass include_info (?include_info=true or "include_info": true) to add each
+    company's name, sector and industry, and model_version to choose the model
+    behind the 60-day projection.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        try:
+            tickers = parse_tickers(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        include_info = bool(data.get('include_info', False))
+        model_version = data.get('model_version')
+    else:
+        tickers = [ticker.strip() for ticker in request.args.get('tickers', '').split(',') if ticker.strip()]
+        include_info = request.args.get('include_info', 'false').lower() in ('1', 'true', 'yes')
+        model_version = request.args.get('model_version')
+
+    if not tickers:
+        return jsonify({"error": "Please provide a list of tickers"}), 400
+    if len(tickers) > MAX_RATING_TICKERS:
+        return jsonify({"error": f"At most {MAX_RATING_TICKERS} tickers can be rated at once"}), 400
+
+    try:
+        bundle = model_registry.get(model_version)
+    except KeyError as e:
+        return jsonify({"error": f"{e.args[0]}. Allowed: {', '.join(model_registry.versions)}"}), 400
+    except Exception as e:
+        # Ratings still work without the projection, which falls back to momentum
+        logging.error(f"Rating without a model, loading it failed: {e}")
+        bundle = None
+
+    try:
+        return jsonify(get_stock_ratings(tickers, bundle, include_info))
+    except Exception as e:
+        logging.error(f"Error rating {tickers}: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
@@ -1,8 +1,9 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, Response, stream_with_context
 from app.services.finance_utils import fetch_financial_metrics
-from app.services.smart_api_client import smart_api
 import yfinance as yf
 import traceback
+import json
+from functools import partial
 from flask import request
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
@@ -61,15 +62,28 @@ def fetch_financial_metrics(angel_symbol, holding_data):
     # Convert to yfinance symbol
     ticker_symbol = convert_to_yfinance_symbol(angel_symbol)
     
-    # Fetch data from yfinance
-    ticker = yf.Ticker(ticker_symbol)
-    info = ticker.info
+    # Fetch fundamentals from the shared cache
+    info = fundamentals_cache.get(ticker_symbol)
+    return build_financial_metrics(ticker_symbol, holding_data, info)
+
+
+def build_financial_metrics(ticker_symbol, holding_data, info, last_price=None):
+    """
+    Builds the financial metrics of a holding from already fetched market data.
     
+    Parameters:
+    ticker_symbol (str): The yfinance symbol of the holding
+    holding_data (dict): Data about this specific holding from Angel Broking API
+    info (dict): The symbol's Ticker.info fundamentals
+    last_price (float): Optional latest close, used when info has no current price
+    """
     # Get holding-specific data
     quantity = int(holding_data.get('quantity', 0))
     avg_price = float(holding_data.get('averageprice', 0))
     current_price = info.get('currentPrice', 0)
     if current_price is None:  # Handle None values
+        current_price = last_price
+    if current_price is None:
         current_price = float(holding_data.get('ltp', 0))  # Use last traded price from Angel if yfinance returns None
     
     # Calculate invested value
@@ -142,22 +156,45 @@ def fetch_financial_metrics(angel_symbol, holding_data):
 
 
 
+def fetch_holdings():
+    """
+    Snapshot of the broker holdings from the broker provider, with concurrent
+    requests (e.g. the dashboard loading /stocks and /investor-behavior together)
+    sharing one call. While the broker is failing, the last good holdings are
+    returned with snapshot.stale set.
+    """
+    return upstream_calls.do(
+        ("smart_api", "holding"),
+        upstream.call_with_snapshot, broker_provider.host, "holding", broker_provider.holding,
+        is_failure=lambda response: not (response and response.get('status'))
+    )
+
+
+def fetch_holdings_metrics(holdings):
+    """
+    Financial metrics of every holding, in order, with prices and fundamentals
+    fetched for the whole portfolio at once.
+    """
+    market_data = fetch_holdings_market_data(holdings)
+    return [
+        build_financial_metrics(data['symbol'], holding, data['info'], data['price'])
+        for holding, data in zip(holdings, market_data)
+    ]
+
+
 @stock_bp.route('/stocks', methods=['GET'])
 def get_stocks():
     holdings_data = []
     try:
         # Get detailed holdings data from the API
-        holdings_response = smart_api.holding()
+        holdings = fetch_holdings()
+        holdings_response = holdings.value
         if holdings_response['status']:
-            # Process each holding
-            for holding in holdings_response['data']:
-                angel_symbol = holding['tradingsymbol']
-                metrics = fetch_financial_metrics(angel_symbol, holding)
-                holdings_data.append(metrics)
+            holdings_data = fetch_holdings_metrics(holdings_response['data'])
         else:
             print(f"Error fetching holdings: {holdings_response['message']}")
             
-        return jsonify(holdings_data)
+        return jsonify(holdings_data), 200, stale_headers(holdings)
     except Exception as e:
         # Log the error
         print(f"Error fetching stock data: {str(e)}")
@@ -169,268 +206,88 @@ def get_stocks():
 
 
 
-import pandas as pd
-import numpy as np
-import datetime
-import yfinance as yf
-import joblib
-from tqdm import tqdm
 import os
 from typing import List, Dict, Any, Union, Tuple
-
-class BiLSTMModel(nn.Module):
-    def __init__(self, input_size=1, hidden_size=64, num_layers=2, output_size=1):
-        super(BiLSTMModel, self).__init__()
-        self.hidden_size = hidden_size
-        self.num_layers = num_layers
-        
-        # BiLSTM layers
-        self.lstm = nn.LSTM(
-            input_size=input_size,
-            hidden_size=hidden_size,
-            num_layers=num_layers,
-            batch_first=True,
-            bidirectional=True
-        )
-        
-        # Fully connected layer
-        self.fc = nn.Linear(hidden_size * 2, output_size)  # *2 because bidirectional
-    
-    def forward(self, x):
-        # Initialize hidden state and cell state
-        batch_size = x.size(0)
-        h0 = torch.zeros(self.num_layers * 2, batch_size, self.hidden_size).to(x.device)  # *2 because bidirectional
-        c0 = torch.zeros(self.num_layers * 2, batch_size, self.hidden_size).to(x.device)
-        
-        # Forward propagate LSTM
-        out, _ = self.lstm(x, (h0, c0))
-        
-        # Get output from last time step
-        out = self.fc(out[:, -1, :])
-        
-        return out
-
-def predict_future(model, last_sequence, steps, scaler_diff, current_price):
-    """Predict future values using trained model and GBM."""
-    model.eval()
-    
-    # Initialize arrays for differences and actual prices
-    future_prices = []
-    future_prices.append(current_price)
-    
-    # Create a copy of the last sequence for prediction
-    current_sequence = last_sequence.clone()
-    
-    # Parameters for Geometric Brownian Motion
-    # Using default parameters if historical data isn't available
-    daily_mu = 0.0002  # Default daily drift
-    daily_sigma = 0.02  # Default daily volatility
-    
-    device = next(model.parameters()).device
-    
-    for _ in range(steps):
-        with torch.no_grad():
-            # Get model prediction for next difference
-            current_sequence_tensor = current_sequence.unsqueeze(0).to(device)
-            pred_diff_scaled = model(current_sequence_tensor)
-            
-            # Inverse transform to get actual difference
-            pred_diff = scaler_diff.inverse_transform(pred_diff_scaled.cpu().numpy())[0][0]
-            
-            # Use GBM to add stochastic component to the predicted difference
-            dt = 1  # One day
-            drift = (daily_mu - 0.5 * daily_sigma**2) * dt
-            diffusion = daily_sigma * np.sqrt(dt) * np.random.normal(0, 1)
-            
-            # Combine model prediction with GBM
-            stochastic_factor = np.exp(drift + diffusion)
-            adjustment = current_price * (stochastic_factor - 1)
-            
-            # Blend model prediction with GBM
-            blend_weight = 0.7  # Higher weight to model prediction
-            blended_diff = (blend_weight * pred_diff) + ((1 - blend_weight) * adjustment)
-            
-            # Calculate next price
-            next_price = current_price + blended_diff
-            
-            # Ensure price doesn't go negative
-            next_price = max(0.01, next_price)
-            
-            # Store results
-            future_prices.append(next_price)
-            
-            # Update current price
-            current_price = next_price
-            
-            # Update sequence for next prediction (with the scaled difference)
-            new_diff_scaled = torch.tensor([[pred_diff_scaled.item()]], dtype=torch.float32)
-            current_sequence = torch.cat([current_sequence[1:], new_diff_scaled], dim=0)
-    
-    future_prices = np.array(future_prices[1:]).reshape(-1, 1)  # Remove the initial price
-    
-    return future_prices
-
-def fetch_and_prepare_data(ticker_symbol: str, seq_length: int) -> Tuple[np.ndarray, float, pd.DatetimeIndex]:
-    """Fetch ticker data and prepare it for prediction."""
-    # Fetch data using yfinance
-    ticker = yf.Ticker(ticker_symbol)
-    df = ticker.history(period="max",interval='1d')
-    
-    # Make sure the data has a Close column
-    if 'Close' not in df.columns:
-        raise ValueError(f"No 'Close' price data available for {ticker_symbol}")
-    
-    # Extract closing prices
-    close_prices = df['Close'].values.astype(float).reshape(-1, 1)
-    
-    # Create differenced data
-    diff_close_prices = np.diff(close_prices, axis=0)
-    
-    # Get the last price (for starting predictions)
-    last_price = close_prices[-1][0]
-    
-    # Get the dates
-    dates = df.index
-    
-    # If we don't have enough data for the sequence length, pad with zeros
-    if len(diff_close_prices) < seq_length:
-        padding = np.zeros((seq_length - len(diff_close_prices), 1))
-        diff_close_prices = np.vstack([padding, diff_close_prices])
-    
-    return diff_close_prices, last_price, dates, df
-
-def predict_stock_prices(
-    ticker_symbols: List[str], 
-    model_path: str, 
-    scaler_path: str, 
-    metadata_path: str
-) -> Dict[str, Any]:
-    """
-    Predict stock prices for multiple ticker symbols for -15 to +15 years.
-    
-    Args:
-        ticker_symbols: List of ticker symbols to predict
-        model_path: Path to the trained BiLSTM model
-        scaler_path: Path to the saved scaler for differences
-        metadata_path: Path to the saved model metadata
-    
-    Returns:
-        Dictionary with ticker symbols as keys and arrays of dates and prices as values
-    """
-    # Set random seeds for reproducibility
-    torch.manual_seed(42)
-    np.random.seed(42)
-    
-    # Load the model, scaler, and metadata
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    
-    # Load model metadata
-    model_metadata = joblib.load(metadata_path)
-    seq_length = model_metadata['seq_length']
-    
-    # Initialize and load the model
-    model = BiLSTMModel().to(device)
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    model.eval()
-    
-    # Load the scaler
-    scaler_diff = joblib.load(scaler_path)
-    
-    # Trading days per year (approximately)
-    trading_days_per_year = 252
-    
-    # Prepare the result dictionary
-    result = {}
-    
-    # Process each ticker symbol
-    for symbol in tqdm(ticker_symbols, desc="Processing tickers"):
-        try:
-            # Fetch and prepare data
-            diff_close_prices, last_price, historical_dates, df = fetch_and_prepare_data(symbol, seq_length)
-            
-            # Scale the differenced data
-            diff_scaled = scaler_diff.transform(diff_close_prices[-seq_length:])
-            
-            # Convert to tensor
-            last_diff_sequence = torch.tensor(diff_scaled, dtype=torch.float32)
-            
-            # Calculate the number of days to predict (15 years)
-            future_days = trading_days_per_year * 15
-            
-            # Predict future prices
-            future_prices = predict_future(model, last_diff_sequence, future_days, scaler_diff, last_price)
-            
-            # Create future dates
-            last_date = historical_dates[-1]
-            future_dates = [last_date + datetime.timedelta(days=i+1) for i in range(future_days)]
-            
-            # Format dates to strings for JSON serialization
-            future_dates_str = [date.strftime('%Y-%m-%d') for date in future_dates]
-            
-            # Get historical dates for past 15 years or as many as available
-            past_days = min(len(historical_dates), trading_days_per_year * 15)
-            historical_subset = historical_dates[-past_days:]
-            historical_prices = df['Close'].values[-past_days:]
-            
-            # Format historical dates to strings
-            historical_dates_str = [date.strftime('%Y-%m-%d') for date in historical_subset]
-            
-            # Combine historical and future data
-            all_dates = historical_dates_str + future_dates_str
-            all_prices = np.concatenate([historical_prices, future_prices.flatten()])
-            
-            # Store in result dictionary
-            result[symbol] = [
-                {"date": date, "value": float(value)} for date, value in zip(all_dates, all_prices)
-            ]
-
-            
-        except Exception as e:
-            print(f"Error processing {symbol}: {str(e)}")
-            result[symbol] = {"error": str(e)}
-    
-    return result
+from app.services.forecasting import (
+    iter_stock_prices, predict_stock_prices, resolution_strides, DEFAULT_HORIZON, DEFAULT_SEED, MAX_HORIZON
+)
+from app.services.model_registry import model_registry
+from app.services.forecast_jobs import forecast_jobs
+from app.services.series_format import (
+    BINARY_MIMETYPE, Series, columnar_payload, pack_binary, parse_layout_options, records_payload, series_payload
+)
+from app.services.trading_calendar import day_array
+from app.services.fundamentals import fundamentals_cache
+from app.services.market_data import fetch_holdings_market_data
+from app.services.providers import broker_provider
+from app.services.single_flight import upstream_calls
+from app.services.upstream import stale_headers, upstream
+from app.services.ohlcv_store import ohlcv_store
+from app.services.ratings import load_closes
+from app.services.rolling_metrics import rolling_metrics
+
+# Largest Monte Carlo ensemble a single request may ask for
+MAX_ENSEMBLE_PATHS = 1024
+
+# Tickers fetched and forecast together by the streaming endpoint
+STREAM_CHUNK_SIZE = 8
 
 def batch_predict_to_json(
     ticker_symbols: List[str], 
-    model_path: str, 
-    scaler_path: str, 
-    metadata_path: str, 
-    output_path: str = "stock_predictions.json"
-) -> str:
+    model_version: str = None,
+    n_paths: int = 1,
+    horizon: int = DEFAULT_HORIZON,
+    resolution="daily",
+    seed: int = DEFAULT_SEED,
+    formatter=records_payload
+) -> Dict[str, Any]:
     """
-    Batch predict stock prices and save to JSON file.
+    Batch predict stock prices, reusing forecasts from the forecast store.
     
     Args:
         ticker_symbols: List of ticker symbols
-        model_path: Path to the trained model
-        scaler_path: Path to the saved scaler
-        metadata_path: Path to the saved metadata
-        output_path: Path to save the output JSON
+        model_version: Model registry version to use (defaults to the served version)
+        n_paths: Number of Monte Carlo paths per ticker (1 for a single forecast)
+        horizon: Number of trading days to forecast
+        resolution: Resolution schedule name or list of [until, step] segments
+        seed: Seed of the forecast's random streams
+        formatter: Lays out each ticker's series (see series_format)
         
     Returns:
-        Path to the saved JSON file
+        Dictionary with ticker symbols as keys and the predicted time series as values
     """
-    # Get predictions
-    predictions = predict_stock_prices(ticker_symbols, model_path, scaler_path, metadata_path)
+    # Get the warm model bundle and run the predictions
+    bundle = model_registry.get(model_version)
+    predictions = predict_stock_prices(
+        ticker_symbols, bundle, seed=seed, n_paths=n_paths, horizon=horizon, resolution=resolution,
+        formatter=formatter
+    )
     
     return predictions
 
 # Example usage
-def get_stock_predictions(tickers):
+def get_stock_predictions(tickers, model_version=None, n_paths=1, horizon=DEFAULT_HORIZON, resolution="daily",
+                          seed=DEFAULT_SEED, formatter=records_payload):
     # Example ticker list
     # tickers = ["AAPL", "MSFT", "GOOGL", "AMZN", "META"]
     
-    # Paths to saved model files
-    model_path = "bilstm_stock_model_new.pth"
-    scaler_path = "scaler_diff.pkl"
-    metadata_path = "model_metadata.pkl"
-    
     # Run batch prediction
-    print('ok')
-    output_file = batch_predict_to_json(tickers, model_path, scaler_path, metadata_path)
+    output_file = batch_predict_to_json(tickers, model_version, n_paths, horizon, resolution, seed, formatter)
     return output_file
 
+def stream_stock_predictions(tickers, model_version=None, chunk_size=STREAM_CHUNK_SIZE, **options):
+    """
+    Yields (ticker, series) pairs as soon as each ticker's forecast is ready.
+
+    Tickers are fetched and forecast chunk_size at a time, so only one chunk's
+    price history is held in memory. Within a chunk, tickers already in the
+    forecast store come out before the model runs for the others.
+    """
+    bundle = model_registry.get(model_version)
+    tickers = list(dict.fromkeys(tickers))
+    for start in range(0, len(tickers), chunk_size):
+        yield from iter_stock_prices(tickers[start:start + chunk_size], bundle, **options)
+
 
 # Generate list of dates from -15 to +15 years around today
 def get_exact_date_range():
@@ -457,14 +314,176 @@ def generate_random_time_series():
         for date in date_list
     ]
 
+def parse_tickers(data, required=True):
+    """
+    The 'tickers' list of a request body.
+    Raises ValueError with a message for the client unless it is a list of
+    ticker strings (non-empty when `required`).
+    """
+    tickers = data.get('tickers', [])
+    if not isinstance(tickers, list) or not all(isinstance(ticker, str) and ticker for ticker in tickers):
+        raise ValueError("tickers must be a list of ticker symbols")
+    if required and not tickers:
+        raise ValueError("Please provide a list of tickers")
+    return tickers
+
+def parse_forecast_options(data):
+    """
+    Validates the forecast options of a time-series request body.
+    Raises ValueError with a message for the client when an option is invalid.
+    """
+    try:
+        model_version = model_registry.resolve(data.get('model_version'))
+    except KeyError as e:
+        raise ValueError(f"{e.args[0]}. Allowed: {', '.join(model_registry.versions)}")
+
+    # Optional Monte Carlo ensemble size, returned as percentile bands
+    try:
+        n_paths = int(data.get('ensemble', 1))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("ensemble must be an integer")
+    if not 1 <= n_paths <= MAX_ENSEMBLE_PATHS:
+        raise ValueError(f"ensemble must be between 1 and {MAX_ENSEMBLE_PATHS}")
+
+    # Optional horizon (trading days) and resolution schedule, e.g. "multi" or
+    # [[90, 1], [252, 5], [3780, 21]] for daily, then weekly, then monthly steps
+    try:
+        horizon = int(data.get('horizon', DEFAULT_HORIZON))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("horizon must be an integer")
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {MAX_HORIZON}")
+
+    resolution = data.get('resolution', 'daily')
+    resolution_strides(resolution, horizon)
+
+    # Optional seed; the same seed gives the same forecast for a ticker
+    try:
+        seed = int(data.get('seed', DEFAULT_SEED))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("seed must be an integer")
+    if not 0 <= seed < 2**32:
+        raise ValueError("seed must be between 0 and 4294967295")
+
+    return {
+        "model_version": model_version,
+        "n_paths": n_paths,
+        "horizon": horizon,
+        "resolution": resolution,
+        "seed": seed,
+    }
+
 @stock_bp.route('/get-time-series', methods=['POST'])
 def get_time_series():
     data = request.get_json()
-    tickers = data.get('tickers', [])
 
-    result = get_stock_predictions(tickers)
-    # print(result)
-    return jsonify(result)
+    try:
+        tickers = parse_tickers(data, required=False)
+        options = parse_forecast_options(data)
+        layout_options = parse_layout_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if layout_options['layout'] == "binary":
+        # Keep the Series objects and pack them all into one buffer
+        result = get_stock_predictions(tickers, **options, formatter=lambda series: series)
+        errors = {ticker: value["error"] for ticker, value in result.items() if not isinstance(value, Series)}
+        body = pack_binary({ticker: value for ticker, value in result.items() if isinstance(value, Series)}, errors=errors)
+        response = Response(body, mimetype=BINARY_MIMETYPE)
+    else:
+        result = get_stock_predictions(tickers, **options, formatter=partial(series_payload, **layout_options))
+        # print(result)
+        response = jsonify(result)
+    response.headers['X-Model-Version'] = options['model_version']
+    return response
+
+
+@stock_bp.route('/get-time-series/stream', methods=['POST'])
+def stream_time_series():
+    """
+    Streaming variant of /get-time-series that sends each ticker as soon as it is forecast.
+
+    Responds with newline-delimited JSON ({"ticker": ..., "data": ...} per line),
+    or with server-sent "forecast" events when the body has "format": "sse" or the
+    client accepts text/event-stream. "data" is laid out as records or columnar
+    (see /get-time-series). A final {"done": true} line or "done" event closes the stream.
+    """
+    data = request.get_json() or {}
+
+    try:
+        tickers = parse_tickers(data)
+        options = parse_forecast_options(data)
+        layout_options = parse_layout_options(data, layouts=("records", "columnar"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stream_format = data.get('format')
+    if stream_format is None:
+        stream_format = "sse" if request.accept_mimetypes.best == "text/event-stream" else "ndjson"
+    if stream_format not in ("ndjson", "sse"):
+        return jsonify({"error": "format must be ndjson or sse"}), 400
+
+    def encode(event, payload):
+        body = json.dumps(payload)
+        if stream_format == "sse":
+            return f"event: {event}\ndata: {body}\n\n"
+        return f"{body}\n"
+
+    def generate():
+        count = 0
+        formatter = partial(series_payload, **layout_options)
+        for ticker, series in stream_stock_predictions(tickers, **options, formatter=formatter):
+            count += 1
+            yield encode("forecast", {"ticker": ticker, "data": series})
+        yield encode("done", {"done": True, "tickers": count})
+
+    mimetype = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['X-Model-Version'] = options['model_version']
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@stock_bp.route('/forecast-jobs', methods=['POST'])
+def create_forecast_job():
+    """
+    Queues a /get-time-series style forecast in the background.
+    Returns the job id to poll /forecast-jobs/<job_id> with.
+    """
+    data = request.get_json() or {}
+
+    try:
+        tickers = parse_tickers(data)
+        options = parse_forecast_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job = forecast_jobs.submit(tickers, **options)
+    return jsonify({
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/forecast-jobs/{job.job_id}"
+    }), 202
+
+
+@stock_bp.route('/forecast-jobs/<job_id>', methods=['GET'])
+def get_forecast_job(job_id):
+    """Returns a forecast job's per-ticker progress and the results finished so far."""
+    job = forecast_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@stock_bp.route('/models', methods=['GET'])
+def get_model_versions():
+    """Lists the servable model versions and the default one."""
+    return jsonify({
+        "default": model_registry.default_version,
+        "versions": list(model_registry.versions)
+    })
 
 
 
@@ -650,20 +669,17 @@ def get_investor_behavior():
     """
     try:
         # Get detailed holdings data from the API
-        holdings_response = smart_api.holding()
+        holdings = fetch_holdings()
+        holdings_response = holdings.value
         holdings_data = []
         
         if holdings_response['status']:
-            # Process each holding
-            for holding in holdings_response['data']:
-                angel_symbol = holding['tradingsymbol']
-                metrics = fetch_financial_metrics(angel_symbol, holding)
-                holdings_data.append(metrics)
+            holdings_data = fetch_holdings_metrics(holdings_response['data'])
             
         
             # Analyze investor behavior
             behavior_analysis = analyze_investor_behavior(holdings_data)
-            return jsonify(behavior_analysis)
+            return jsonify(behavior_analysis), 200, stale_headers(holdings)
         else:
             print(f"Error fetching holdings: {holdings_response['message']}")
             return jsonify({"error": "Unable to fetch holdings data"})
@@ -703,7 +719,8 @@ def get_safe_info(ticker_info, key, default=None):
 def get_stock_data(ticker_symbol):
     """
     Fetches historical data and fundamental info for a given stock ticker.
-    Accepts 'interval' and 'period' query parameters.
+    Accepts 'interval' and 'period' query parameters, and 'layout' ("records",
+    "columnar" or "binary"), 'dates' and 'precision' for the history payload.
     """
 
 
@@ -722,6 +739,11 @@ def get_stock_data(ticker_symbol):
     if period not in allowed_periods:
          return jsonify({"error": f"Invalid period. Allowed: {', '.join(allowed_periods)}"}), 400
 
+    try:
+        layout_options = parse_layout_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     # --- Important yfinance constraints ---
     # Hourly data typically limited to last 730 days (2y)
     # Minute data typically limited to last 7 days (for >1d period) or 60 days (intraday)
@@ -739,17 +761,15 @@ def get_stock_data(ticker_symbol):
     logging.info(f"Fetching data for {ticker_symbol}, Interval: {interval}, Period: {period}")
 
     try:
-        ticker = yf.Ticker(ticker_symbol)
-
         # 1. Get Historical Data
-        # Use repair=True to attempt fixing some data issues
-        history_df = ticker.history(period=period, interval=interval, repair=True)
+        # Served from the local store, which keeps yfinance's repaired bars and only fetches new ones
+        history_df = ohlcv_store.history(ticker_symbol, period=period, interval=interval)
 
         if history_df.empty:
              # Check if ticker exists but has no data for this period/interval
              try:
                  # Attempt to get basic info to see if ticker is valid at all
-                 _ = ticker.info.get('symbol')
+                 _ = fundamentals_cache.get(ticker_symbol).get('symbol')
                  logging.warning(f"No historical data found for {ticker_symbol} with period={period}, interval={interval}")
                  return jsonify({
                      "error": f"No historical data found for {ticker_symbol} for the selected period/interval.",
@@ -761,37 +781,51 @@ def get_stock_data(ticker_symbol):
                   return jsonify({"error": f"Invalid ticker symbol or data not available: {ticker_symbol}"}), 404
 
 
-        # Prepare history data for JSON and charting
-        history_df = history_df.reset_index() # Make Datetime index a column
+        if layout_options['layout'] == "records":
+            # Prepare history data for JSON and charting
+            history_df = history_df.reset_index() # Make Datetime index a column
 
-        # Ensure correct column names (lowercase for consistency)
-        history_df.columns = [col.lower().replace(' ', '_').replace('datetime', 'date') for col in history_df.columns]
+            # Ensure correct column names (lowercase for consistency)
+            history_df.columns = [col.lower().replace(' ', '_').replace('datetime', 'date') for col in history_df.columns]
 
-        # Convert date to ISO format string (better for cross-language compatibility)
-        # Make sure the column name is 'date' after lowercasing
-        date_col_name = 'date' # Adjust if your lowercasing changes 'Datetime' or 'Date' differently
-        if date_col_name not in history_df.columns:
-             # Try common alternatives if renaming failed unexpectedly
-             potential_date_cols = ['timestamp', 'index']
-             for col in potential_date_cols:
-                 if col in history_df.columns:
-                     date_col_name = col
-                     break
-             else:
-                 return jsonify({"error": "Could not find date column in historical data."}), 500
+            # Convert date to ISO format string (better for cross-language compatibility)
+            # Make sure the column name is 'date' after lowercasing
+            date_col_name = 'date' # Adjust if your lowercasing changes 'Datetime' or 'Date' differently
+            if date_col_name not in history_df.columns:
+                 # Try common alternatives if renaming failed unexpectedly
+                 potential_date_cols = ['timestamp', 'index']
+                 for col in potential_date_cols:
+                     if col in history_df.columns:
+                         date_col_name = col
+                         break
+                 else:
+                     return jsonify({"error": "Could not find date column in historical data."}), 500
 
 
-        history_df[date_col_name] = history_df[date_col_name].apply(lambda d: d.isoformat())
+            history_df[date_col_name] = history_df[date_col_name].apply(lambda d: d.isoformat())
 
-        # Select and rename columns for the chart
-        history_df = history_df[[date_col_name, 'open', 'high', 'low', 'close', 'volume']]
-        # Replace potential NaN/Infinity values with None before conversion
-        history_df.replace([np.inf, -np.inf], np.nan, inplace=True)
-        history_data = history_df.where(pd.notnull(history_df), None).to_dict('records') # Convert NaN to None
+            # Select and rename columns for the chart
+            history_df = history_df[[date_col_name, 'open', 'high', 'low', 'close', 'volume']]
+            # Replace potential NaN/Infinity values with None before conversion
+            history_df.replace([np.inf, -np.inf], np.nan, inplace=True)
+            history_data = history_df.where(pd.notnull(history_df), None).to_dict('records') # Convert NaN to None
+        else:
+            # Columnar and binary payloads are laid out from the raw columns
+            index = history_df.index
+            if interval == '1d':
+                dates = day_array(index)
+            else:
+                # Intraday times are sent in UTC
+                if index.tz is not None:
+                    index = index.tz_convert('UTC').tz_localize(None)
+                dates = index.values.astype('datetime64[s]')
+            history_series = Series(dates, {
+                column.lower(): history_df[column].values for column in ['Open', 'High', 'Low', 'Close', 'Volume']
+            })
 
 
         # 2. Get Fundamental Info
-        ticker_info = ticker.info
+        ticker_info = fundamentals_cache.get(ticker_symbol)
 
         # Select and clean relevant fundamental data
         # Choose metrics you want to display - consult yfinance docs/ticker.info output
@@ -835,6 +869,10 @@ def get_stock_data(ticker_symbol):
 
 
         logging.info(f"Successfully fetched data for {ticker_symbol}")
+        if layout_options['layout'] == "binary":
+            return Response(pack_binary({ticker_symbol: history_series}, info=fundamentals), mimetype=BINARY_MIMETYPE)
+        if layout_options['layout'] == "columnar":
+            history_data = columnar_payload(history_series, layout_options['date_encoding'], layout_options['precision'])
         return jsonify({
             "info": fundamentals,
             "history": history_data
@@ -887,10 +925,11 @@ def get_stock_data(ticker):
         stock = yf.Ticker(ticker)
         
         # Get basic info
-        info = stock.info
+        info = fundamentals_cache.get(ticker)
         
-        # Get historical price data
-        hist = stock.history(period="1y")
+        # Risk metrics from the ticker's rolling state, which only takes in new bars
+        closes = load_closes([ticker]).get(ticker)
+        risk = rolling_metrics.sync(ticker, closes.dates, closes.close).snapshot() if closes is not None else {}
         
         # Calculate additional metrics
         current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
@@ -989,7 +1028,13 @@ def get_stock_data(ticker):
             "trailing_eps": info.get('trailingEps', 0),
             "forward_eps": info.get('forwardEps', 0),
             "shares_outstanding": info.get('sharesOutstanding', 0),
-            "short_ratio": info.get('shortRatio', 0)
+            "short_ratio": info.get('shortRatio', 0),
+            
+            # Risk metrics
+            "volatility": risk.get('volatility_annual', 0),
+            "max_drawdown": risk.get('max_drawdown', 0),
+            "sharpe_ratio": risk.get('sharpe_ratio', 0),
+            "one_year_return": risk.get('one_year_return', 0)
         }
         
         return result
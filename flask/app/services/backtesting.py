@@ -0,0 +1,305 @@
+import os
+import logging
+import warnings
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import torch
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app import config
+from app.services.forecasting import ForecastKernel
+
+# Models the BiLSTM + GBM blend can be compared against
+BASELINE_MODELS = ("arima", "sarima")
+
+# Orders used for the baselines in the benchmarking notebook
+ARIMA_ORDER = (5, 1, 2)
+SARIMA_ORDER = (1, 1, 1)
+SARIMA_SEASONAL_ORDER = (1, 1, 1, 5)
+
+
+def walk_forward_origins(n_bars: int, min_train: int, max_horizon: int, step: int,
+                         max_origins: Optional[int] = None) -> np.ndarray:
+    """
+    Positions of the forecast origins of a rolling walk-forward evaluation.
+
+    An origin is the index of the last bar the forecast may see. The first one
+    leaves `min_train` bars of history, later ones move forward `step` bars at a
+    time, and every origin leaves `max_horizon` bars after it to score against.
+    With `max_origins` only the most recent origins are kept.
+    """
+    last = n_bars - 1 - max_horizon
+    first = min_train - 1
+    if last < first:
+        return np.array([], dtype=int)
+    # Anchor the schedule on the most recent origin so it stays put as history grows
+    origins = np.arange(last, first - 1, -step)[::-1]
+    if max_origins is not None:
+        origins = origins[-max_origins:]
+    return origins
+
+
+class WindowCache:
+    """
+    Scaled input windows of every bar of a ticker, computed once per scaler.
+
+    The scaled differences are saved as .npy files under `directory`, keyed by
+    the ticker, the model fingerprint and the last bar, so re-running a backtest
+    over the same history skips the scaling. The windows themselves are a
+    zero-copy sliding view over those differences.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._scaled: Dict[tuple, np.ndarray] = {}
+
+    def _path(self, key: tuple) -> str:
+        filename = "__".join(str(part).replace(os.sep, "_") for part in key)
+        return os.path.join(self.directory, f"{filename}.npy")
+
+    def scaled_diffs(self, symbol: str, closes: np.ndarray, fingerprint: str, scaler_diff) -> np.ndarray:
+        key = (symbol, fingerprint, len(closes), f"{closes[-1]:.6f}")
+        scaled = self._scaled.get(key)
+        if scaled is not None:
+            return scaled
+
+        path = self._path(key)
+        try:
+            scaled = np.load(path)
+        except (OSError, ValueError):
+            scaled = scaler_diff.transform(np.diff(closes).reshape(-1, 1))[:, 0].astype(np.float32)
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, scaled)
+            os.replace(tmp_path, path)
+
+        self._scaled[key] = scaled
+        return scaled
+
+    def windows(self, symbol: str, closes: np.ndarray, fingerprint: str, scaler_diff,
+                seq_length: int, origins: np.ndarray) -> np.ndarray:
+        """Array of shape (len(origins), seq_length) with the model input at every origin."""
+        scaled = self.scaled_diffs(symbol, closes, fingerprint, scaler_diff)
+        # Pad short histories with zeros, like fetch_and_prepare_data does
+        padded = np.concatenate([np.zeros(seq_length, dtype=np.float32), scaled])
+        # Window i covers the differences ending at close i, i.e. padded[i:i + seq_length]
+        return sliding_window_view(padded, seq_length)[origins]
+
+
+def fold_seed(seed: int, symbol: str, origin: int) -> int:
+    """Seed of one fold, independent of how the folds are chunked across workers."""
+    return (seed * 1_000_003 + zlib.crc32(symbol.encode()) + origin) % (2**63)
+
+
+def forecast_errors(forecast: np.ndarray, actual: np.ndarray, horizons: Sequence[int]) -> Dict[int, Dict[str, float]]:
+    """MAPE and RMSE over the first h steps, and the error of the h-th step, for every horizon."""
+    errors = {}
+    for horizon in horizons:
+        diff = forecast[:horizon] - actual[:horizon]
+        errors[horizon] = {
+            "mape": float(np.mean(np.abs(diff / actual[:horizon])) * 100),
+            "rmse": float(np.sqrt(np.mean(diff**2))),
+            "end_ape": float(abs(diff[-1] / actual[horizon - 1]) * 100),
+        }
+    return errors
+
+
+def fit_baseline(name: str, train: np.ndarray, steps: int) -> np.ndarray:
+    """Fit an ARIMA or SARIMA baseline on the training closes and forecast `steps` bars."""
+    # statsmodels is only needed for backtests, so it isn't imported with the app
+    from statsmodels.tsa.arima.model import ARIMA
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    with warnings.catch_warnings():
+        # Convergence warnings on individual folds would drown out the progress output
+        warnings.simplefilter("ignore")
+        if name == "arima":
+            model_fit = ARIMA(train, order=ARIMA_ORDER).fit()
+        elif name == "sarima":
+            model_fit = SARIMAX(train, order=SARIMA_ORDER, seasonal_order=SARIMA_SEASONAL_ORDER).fit(disp=False)
+        else:
+            raise ValueError(f"Unknown baseline: {name}. Allowed: {', '.join(BASELINE_MODELS)}")
+    return np.asarray(model_fit.forecast(steps), dtype=float)
+
+
+# Model registry of a backtest worker process, set up by init_worker
+_registry = None
+
+
+def init_worker(model_versions, model_dir, backend, threads):
+    global _registry
+    from app.services.model_registry import ModelRegistry
+
+    # Keep worker processes from oversubscribing the CPU cores between them
+    torch.set_num_threads(threads)
+    _registry = ModelRegistry(model_versions, model_dir, next(iter(model_versions)), backend=backend)
+
+
+def run_fold(symbol: str, closes: np.ndarray, origins: np.ndarray, windows: Dict[str, np.ndarray],
+             horizons: Sequence[int], baselines: Sequence[str], n_paths: int, seed: int,
+             fit_window: Optional[int]) -> List[Dict]:
+    """
+    Forecast a chunk of origins of one ticker with every model and score the forecasts.
+
+    Every origin gets its own GBM noise stream, seeded from the ticker and origin.
+    Returns one row per (origin, model, horizon).
+    """
+    max_horizon = max(horizons)
+    actual_by_origin = {origin: closes[origin + 1:origin + 1 + max_horizon] for origin in origins}
+    rows = []
+
+    def add_rows(model_name, origin, forecast):
+        for horizon, errors in forecast_errors(forecast, actual_by_origin[origin], horizons).items():
+            rows.append({"symbol": symbol, "origin": int(origin), "model": model_name, "horizon": horizon, **errors})
+
+    for version, version_windows in windows.items():
+        bundle = _registry.get(version)
+        kernel = ForecastKernel(bundle.model, bundle.scaler_diff)
+        # Seed each fold on its own so results don't depend on chunking
+        for origin, window in zip(origins, version_windows):
+            generator = torch.Generator().manual_seed(fold_seed(seed, symbol, int(origin)))
+            window_tensor = torch.tensor(window, dtype=torch.float32).view(1, -1, 1)
+            if n_paths > 1:
+                # Score the ensemble median, which is less arbitrary than a single sample path
+                forecast = kernel.run(window_tensor, max_horizon, closes[[origin]], generator,
+                                      n_paths=n_paths, quantiles=(50,))[0, 0]
+            else:
+                forecast = kernel.run(window_tensor, max_horizon, closes[[origin]], generator)[0]
+            add_rows(version, origin, forecast)
+
+    for name in baselines:
+        for origin in origins:
+            start = 0 if fit_window is None else max(0, origin + 1 - fit_window)
+            try:
+                forecast = fit_baseline(name, closes[start:origin + 1], max_horizon)
+            except Exception as e:
+                logging.warning(f"{name} failed for {symbol} at bar {origin}: {e}")
+                continue
+            add_rows(name, origin, forecast)
+
+    return rows
+
+
+def summarize(rows: pd.DataFrame) -> Dict:
+    """Average the fold errors per model and horizon, overall and per ticker."""
+    metrics = ["mape", "rmse", "end_ape"]
+    overall = rows.groupby(["model", "horizon"])[metrics].mean()
+    folds = rows.groupby(["model", "horizon"]).size()
+    per_ticker = rows.groupby(["symbol", "model", "horizon"])[metrics].mean()
+
+    summary = {"models": {}, "tickers": {}}
+    for (model, horizon), values in overall.iterrows():
+        summary["models"].setdefault(model, {})[str(horizon)] = {
+            **{metric: float(values[metric]) for metric in metrics},
+            "folds": int(folds[(model, horizon)]),
+        }
+    for (symbol, model, horizon), values in per_ticker.iterrows():
+        summary["tickers"].setdefault(symbol, {}).setdefault(model, {})[str(horizon)] = {
+            metric: float(values[metric]) for metric in metrics
+        }
+    return summary
+
+
+def walk_forward_backtest(
+    history: Dict[str, np.ndarray],
+    versions: Sequence[str],
+    horizons: Sequence[int] = (5, 21, 63),
+    step: int = 21,
+    min_train: int = 252,
+    max_origins: Optional[int] = None,
+    baselines: Sequence[str] = BASELINE_MODELS,
+    n_paths: int = 1,
+    seed: int = 42,
+    fit_window: Optional[int] = 750,
+    workers: int = 1,
+    chunk_size: int = 8,
+    backend: str = "eager",
+    cache_dir: str = None,
+    progress=None
+) -> Dict:
+    """
+    Walk-forward evaluation of the BiLSTM + GBM forecaster against ARIMA/SARIMA.
+
+    For every ticker, forecasts are made from rolling origins `step` bars apart
+    and scored against the bars that followed, for every horizon. The folds of
+    all tickers are spread over a process pool in chunks of `chunk_size` origins.
+
+    Args:
+        history: Daily closes of every ticker, oldest first
+        versions: Model versions to evaluate
+        horizons: Forecast horizons in trading days to score
+        step: Bars between consecutive origins
+        min_train: Bars of history before the first origin
+        max_origins: Optional cap on the origins per ticker (the most recent are kept)
+        baselines: Baseline models to fit at every origin
+        n_paths: Sample paths behind the BiLSTM forecast (the median is scored when > 1)
+        seed: Seed for the GBM noise
+        fit_window: Bars the baselines are fit on (None for all history up to the origin)
+        workers: Worker processes
+        chunk_size: Origins per task
+        backend: Inference backend the model versions are loaded with
+        cache_dir: Where the scaled windows are cached
+        progress: Optional callback called as progress(done, total) after every chunk
+
+    Returns:
+        Dictionary with the mean errors per model and horizon, overall and per ticker
+    """
+    from app.services.model_registry import ModelRegistry
+
+    horizons = sorted(set(int(horizon) for horizon in horizons))
+    if not horizons or horizons[0] < 1:
+        raise ValueError("Horizons must be positive")
+    for name in baselines:
+        if name not in BASELINE_MODELS:
+            raise ValueError(f"Unknown baseline: {name}. Allowed: {', '.join(BASELINE_MODELS)}")
+
+    registry = ModelRegistry(config.MODEL_VERSIONS, config.MODEL_DIR, versions[0], backend=backend)
+    cache = WindowCache(cache_dir or os.path.join(config.DATA_DIR, "backtests", "windows"))
+
+    # Build every task up front, with only the windows each chunk needs
+    tasks = []
+    for symbol, closes in history.items():
+        closes = np.asarray(closes, dtype=float)
+        origins = walk_forward_origins(len(closes), min_train, horizons[-1], step, max_origins)
+        if len(origins) == 0:
+            logging.warning(f"Not enough history to backtest {symbol} ({len(closes)} bars)")
+            continue
+
+        windows = {}
+        for version in versions:
+            bundle = registry.get(version)
+            windows[version] = cache.windows(
+                symbol, closes, bundle.fingerprint, bundle.scaler_diff, bundle.seq_length, origins
+            )
+
+        # Workers only need the closes up to the last bar scored
+        closes = closes[:origins[-1] + 1 + horizons[-1]]
+        for start in range(0, len(origins), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            tasks.append((
+                symbol, closes, origins[chunk], {version: w[chunk] for version, w in windows.items()},
+                horizons, list(baselines), n_paths, seed, fit_window
+            ))
+
+    rows = []
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(config.MODEL_VERSIONS, config.MODEL_DIR, backend, threads)) as executor:
+        futures = [executor.submit(run_fold, *task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            rows.extend(future.result())
+            if progress is not None:
+                progress(done, len(futures))
+
+    if not rows:
+        raise ValueError("No folds could be evaluated")
+
+    rows = pd.DataFrame(rows)
+    summary = summarize(rows)
+    summary["folds"] = int(rows[["symbol", "origin"]].drop_duplicates().shape[0])
+    return summary
@@ -1,4 +1,4 @@
-import yfinance as yf
+from app.services.fundamentals import fundamentals_cache
 
 def convert_to_yfinance_symbol(angel_symbol):
     base_symbol = angel_symbol.replace("-EQ", "")
@@ -9,8 +9,7 @@ def convert_to_yfinance_symbol(angel_symbol):
 
 def fetch_financial_metrics(angel_symbol, holding_data):
     ticker_symbol = convert_to_yfinance_symbol(angel_symbol)
-    ticker = yf.Ticker(ticker_symbol)
-    info = ticker.info
+    info = fundamentals_cache.get(ticker_symbol)
 
     quantity = int(holding_data.get('quantity', 0))
     avg_price = float(holding_data.get('averageprice', 0))
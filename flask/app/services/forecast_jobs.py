@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app import config
+from app.services.forecasting import predict_stock_prices
+from app.services.model_registry import model_registry
+
+
+class ForecastJob:
+    """A multi-ticker forecast running in the background, with per-ticker progress."""
+
+    def __init__(self, tickers: List[str], options: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex
+        self.tickers = list(dict.fromkeys(tickers))
+        self.options = options
+        self.status = "queued"
+        self.error = None
+        self.progress = {ticker: "queued" for ticker in self.tickers}
+        self.results: Dict[str, Any] = {}
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, ticker: str, state: str, result=None):
+        with self._lock:
+            self.progress[ticker] = state
+            if result is not None:
+                self.results[ticker] = result
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = sum(state in ("done", "error") for state in self.progress.values())
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "error": self.error,
+                "progress": dict(self.progress),
+                "completed": completed,
+                "total": len(self.tickers),
+                "model_version": self.options.get("model_version"),
+                "results": dict(self.results),
+            }
+
+
+class ForecastJobQueue:
+    """
+    Runs forecast jobs on a worker pool so web workers don't block on them.
+
+    Finished jobs are kept for `ttl` seconds so clients can poll for the results.
+    """
+
+    def __init__(self, max_workers: int = 1, ttl: float = 3600):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._executor = None
+        self._jobs: Dict[str, ForecastJob] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, job: ForecastJob):
+        job.status = "running"
+        try:
+            bundle = model_registry.get(job.options.get("model_version"))
+            options = {key: value for key, value in job.options.items() if key != "model_version"}
+            predict_stock_prices(job.tickers, bundle, progress=job.update, **options)
+            job.status = "done"
+        except Exception as e:
+            logging.error(f"Forecast job {job.job_id} failed: {e}", exc_info=True)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _expire(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, tickers: List[str], **options) -> ForecastJob:
+        """Queue a forecast for the tickers and return the job straight away."""
+        job = ForecastJob(tickers, options)
+        with self._lock:
+            self._expire()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="forecast-job")
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ForecastJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+forecast_jobs = ForecastJobQueue(config.FORECAST_JOB_WORKERS, config.FORECAST_JOB_TTL)
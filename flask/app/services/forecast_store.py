@@ -0,0 +1,116 @@
+import os
+import glob
+import time
+import logging
+import threading
+import urllib.parse
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app import config
+
+
+class ForecastStore:
+    """
+    Persistent store of forecast price paths with an in-memory LRU in front.
+
+    Entries are keyed by (ticker, model fingerprint, last bar date, horizon, seed)
+    and saved as one .npy file each, so a forecast is only recomputed when a new
+    daily bar arrives or the model changes. Entries of a ticker made from older
+    bars are dropped when a newer bar is stored, whichever model made them, and
+    files not written for `max_age` seconds (e.g. of models that were reloaded
+    or retired, or tickers no longer requested) are swept at most once an hour.
+    """
+
+    # Seconds between sweeps of expired files
+    SWEEP_INTERVAL = 3600
+
+    def __init__(self, directory: str, max_entries: int = 256, max_age: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._cache: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def _path(self, key: Tuple) -> str:
+        # Quote each part so tickers like "^NSEI" or "BRK/B" make safe file names
+        filename = "__".join(urllib.parse.quote(str(part), safe='') for part in key)
+        return os.path.join(self.directory, f"{filename}.npy")
+
+    def _remember(self, key: Tuple, values: np.ndarray):
+        with self._lock:
+            self._cache[key] = values
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def get(self, key: Tuple) -> Optional[np.ndarray]:
+        """Return the stored forecast for a key, or None if it hasn't been computed."""
+        with self._lock:
+            values = self._cache.get(key)
+            if values is not None:
+                self._cache.move_to_end(key)
+                return values
+
+        try:
+            values = np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, values)
+        return values
+
+    def put(self, key: Tuple, values: np.ndarray):
+        """Store a forecast in memory and on disk."""
+        values = np.asarray(values)
+        values.setflags(write=False)
+        self._remember(key, values)
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+
+        # Write to a temporary file first so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp_path, path)
+
+        # Drop forecasts made from older bars of the same ticker, by any model:
+        # a newer bar makes all of them stale
+        ticker, last_bar_date = key[0], str(key[2])
+        prefix = self._path((ticker,))[:-len(".npy")]
+        for stale_path in glob.glob(glob.escape(prefix) + "__*.npy"):
+            stale_bar_date = urllib.parse.unquote(os.path.basename(stale_path).split("__")[2])
+            if stale_bar_date < last_bar_date:
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
+
+        self._sweep()
+
+    def _sweep(self):
+        """Delete files older than max_age, at most once every SWEEP_INTERVAL seconds."""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+
+        removed = 0
+        for path in glob.glob(os.path.join(glob.escape(self.directory), "*.npy")) + \
+                glob.glob(os.path.join(glob.escape(self.directory), "*.tmp")):
+            try:
+                if now - os.path.getmtime(path) > self.max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        if removed:
+            logging.info(f"Removed {removed} expired forecasts from {self.directory}")
+
+
+forecast_store = ForecastStore(config.FORECAST_STORE_DIR, config.FORECAST_CACHE_SIZE, config.FORECAST_STORE_MAX_AGE)
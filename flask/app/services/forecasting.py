@@ -0,0 +1,511 @@
+import zlib
+from typing import List, Dict, Any, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+
+from app.services.forecast_store import forecast_store
+from app.services.ohlcv_store import ohlcv_store
+from app.services.series_format import Series, records_payload
+from app.services.trading_calendar import exchange_for_symbol, future_trading_days, day_array
+
+# Seed of a forecast when the request doesn't choose one
+DEFAULT_SEED = 42
+
+# Percentile bands returned for Monte Carlo ensemble forecasts
+ENSEMBLE_QUANTILES = (5, 25, 50, 75, 95)
+
+# Upper bound on the number of GBM noise values drawn ahead of the loop at once per row
+MAX_NOISE_ELEMENTS = 1_000_000
+
+# Trading days per year (approximately)
+TRADING_DAYS_PER_YEAR = 252
+
+# Default forecast horizon in trading days (15 years) and the longest one allowed
+DEFAULT_HORIZON = TRADING_DAYS_PER_YEAR * 15
+MAX_HORIZON = TRADING_DAYS_PER_YEAR * 30
+
+# Named resolution schedules: (until trading day, step in trading days) segments,
+# where None means "until the end of the horizon"
+RESOLUTION_PRESETS = {
+    "daily": [(None, 1)],
+    # Daily for ~4 months, weekly for the rest of the first year, then monthly
+    "multi": [(90, 1), (TRADING_DAYS_PER_YEAR, 5), (None, 21)],
+}
+
+
+class BiLSTMModel(nn.Module):
+    def __init__(self, input_size=1, hidden_size=64, num_layers=2, output_size=1):
+        super(BiLSTMModel, self).__init__()
+        self.hidden_size = hidden_size
+        self.num_layers = num_layers
+
+        # BiLSTM layers
+        self.lstm = nn.LSTM(
+            input_size=input_size,
+            hidden_size=hidden_size,
+            num_layers=num_layers,
+            batch_first=True,
+            bidirectional=True
+        )
+
+        # Fully connected layer
+        self.fc = nn.Linear(hidden_size * 2, output_size)  # *2 because bidirectional
+
+    def forward(self, x):
+        # Initialize hidden state and cell state
+        batch_size = x.size(0)
+        h0 = torch.zeros(self.num_layers * 2, batch_size, self.hidden_size).to(x.device)  # *2 because bidirectional
+        c0 = torch.zeros(self.num_layers * 2, batch_size, self.hidden_size).to(x.device)
+
+        # Forward propagate LSTM
+        out, _ = self.lstm(x, (h0, c0))
+
+        # Get output from last time step
+        out = self.fc(out[:, -1, :])
+
+        return out
+
+def model_device(model) -> torch.device:
+    """Device a model runs on (quantized and frozen models without parameters run on the CPU)."""
+    parameter = next(iter(model.parameters()), None)
+    return parameter.device if parameter is not None else torch.device('cpu')
+
+class ForecastKernel:
+    """
+    Autoregressive BiLSTM + GBM forecaster that keeps the whole loop in torch.
+
+    The MinMax inverse-transform constants live on the model's device, the GBM
+    noise for the whole horizon is drawn up front, and the input window is a
+    preallocated ring buffer that is advanced in place, so a step only costs the
+    model's forward pass plus a handful of in-place tensor ops.
+    """
+
+    def __init__(self, model, scaler_diff, blend_weight=0.7, daily_mu=0.0002, daily_sigma=0.02):
+        self.model = model
+        self.device = model_device(model)
+
+        # MinMaxScaler maps x to x * scale_ + min_
+        self.diff_scale = torch.tensor(scaler_diff.scale_[0], dtype=torch.float64, device=self.device)
+        self.diff_min = torch.tensor(scaler_diff.min_[0], dtype=torch.float64, device=self.device)
+
+        self.blend_weight = blend_weight  # Higher weight to model prediction
+        self.daily_mu = daily_mu  # Default daily drift
+        self.daily_sigma = daily_sigma  # Default daily volatility
+
+    def gbm_growth(self, shape, generator=None, dt=1):
+        """
+        Draw the GBM part of the blend for a block of steps at once.
+
+        Returns a tensor of `shape` (the last dimension being steps) holding the
+        factor the previous price is multiplied by before the model's predicted
+        difference is added. `dt` is the length of each step in trading days.
+        `generator` is a torch.Generator, or a list with one generator for each
+        entry of the first dimension.
+        """
+        dt = torch.as_tensor(dt, dtype=torch.float64)
+        drift = (self.daily_mu - 0.5 * self.daily_sigma**2) * dt
+        if isinstance(generator, (list, tuple)):
+            noise = torch.stack([torch.randn(shape[1:], generator=g, dtype=torch.float64) for g in generator])
+        else:
+            noise = torch.randn(shape, generator=generator, dtype=torch.float64)
+        stochastic_factor = torch.exp(drift + self.daily_sigma * torch.sqrt(dt) * noise)
+
+        # price + (1 - w) * price * (factor - 1) == price * (1 + (1 - w) * (factor - 1))
+        return (1 + (1 - self.blend_weight) * (stochastic_factor - 1)).to(self.device)
+
+    def run(self, last_sequences, steps, current_prices, generator=None, n_paths=1, quantiles=None, strides=None):
+        """
+        Forecast `steps` prices for every row of `last_sequences`.
+
+        Args:
+            last_sequences: Tensor of shape (N, seq_length, 1) with the scaled differences
+            steps: Number of future steps to predict
+            current_prices: Array of shape (N,) with the last observed price of each ticker
+            generator: Optional torch.Generator for the GBM noise, or a list with one
+                generator per row so that a row's forecast doesn't depend on the
+                other rows it is batched with
+            n_paths: Number of GBM sample paths simulated for every row
+            quantiles: Optional percentiles (0-100) to summarise the sample paths with
+            strides: Optional length of every step in trading days (all 1 by default).
+                A step of k days applies the model's predicted daily difference and
+                the GBM drift and volatility over k days with one forward pass
+
+        Returns:
+            Array of shape (N, steps) with the predicted prices for a single path,
+            (N, len(quantiles), steps) with percentile bands when quantiles are given,
+            or (N, n_paths, steps) with every sample path otherwise
+        """
+        self.model.eval()
+
+        n, seq_length, _ = last_sequences.shape
+
+        # The GBM noise is drawn for the whole horizon, or in blocks of steps when
+        # that would be too large to keep around for many sample paths. The block
+        # length mustn't depend on the batch size: with one generator per row, a
+        # row's draws (and so its forecast) would change with its batch-mates
+        noise_block = max(1, min(steps, MAX_NOISE_ELEMENTS // n_paths))
+        growth = None
+
+        strides = np.ones(steps, dtype=int) if strides is None else np.asarray(strides, dtype=int)
+
+        # Mirrored ring buffer: every value is written at i and i + seq_length, so
+        # window_buffer[:, head:head + seq_length] is always the current window in order
+        window_buffer = torch.empty((n, 2 * seq_length, 1), dtype=torch.float32, device=self.device)
+        window_buffer[:, :seq_length] = last_sequences
+        window_buffer[:, seq_length:] = last_sequences
+        head = 0
+
+        # The model only ever sees its own predictions, never the blended prices, so
+        # its trajectory is shared by every sample path of a row and each step needs
+        # a single forward pass however many paths are simulated
+        price = torch.as_tensor(np.asarray(current_prices, dtype=float), dtype=torch.float64, device=self.device)
+        price = price.unsqueeze(1).repeat(1, n_paths)
+
+        if quantiles is not None:
+            q = torch.tensor(quantiles, dtype=torch.float64, device=self.device) / 100
+            future_prices = torch.empty((n, len(quantiles), steps), dtype=torch.float64, device=self.device)
+        elif n_paths > 1:
+            future_prices = torch.empty((n, n_paths, steps), dtype=torch.float64, device=self.device)
+        else:
+            future_prices = torch.empty((n, steps), dtype=torch.float64, device=self.device)
+
+        with torch.inference_mode():
+            for step in range(steps):
+                if step % noise_block == 0:
+                    block_strides = strides[step:step + noise_block]
+                    growth = self.gbm_growth((n, n_paths, len(block_strides)), generator, block_strides)
+                dt = int(strides[step])
+
+                # Get model prediction for next scaled difference of every row
+                pred_diff_scaled = self.model(window_buffer[:, head:head + seq_length])[:, 0]
+
+                # Overwrite the oldest values of the window with the new prediction,
+                # once for every day the step covers
+                for _ in range(min(dt, seq_length)):
+                    window_buffer[:, head, 0] = pred_diff_scaled
+                    window_buffer[:, head + seq_length, 0] = pred_diff_scaled
+                    head = (head + 1) % seq_length
+
+                # Inverse transform to get the actual difference
+                pred_diff = pred_diff_scaled.double().sub_(self.diff_min).div_(self.diff_scale)
+
+                # Blend model prediction with GBM, ensuring the price doesn't go negative
+                price.mul_(growth[:, :, step % noise_block]).add_(pred_diff.unsqueeze(1), alpha=self.blend_weight * dt)
+                price.clamp_min_(0.01)
+
+                if quantiles is not None:
+                    future_prices[:, :, step] = torch.quantile(price, q, dim=1).T
+                elif n_paths > 1:
+                    future_prices[:, :, step] = price
+                else:
+                    future_prices[:, step] = price[:, 0]
+
+        return future_prices.cpu().numpy()
+
+def resolution_strides(resolution, horizon: int) -> np.ndarray:
+    """
+    Turn a resolution schedule into the length of every forecast step.
+
+    Args:
+        resolution: A RESOLUTION_PRESETS name or a list of [until, step] segments,
+            e.g. [[90, 1], [252, 5], [3780, 21]]: daily for 90 trading days, then
+            weekly until day 252, then monthly until day 3780
+        horizon: Forecast horizon in trading days
+
+    Returns:
+        Array with the number of trading days covered by each step, summing to horizon
+    """
+    if isinstance(resolution, str):
+        if resolution not in RESOLUTION_PRESETS:
+            raise ValueError(f"Unknown resolution: {resolution}. Allowed: {', '.join(RESOLUTION_PRESETS)}")
+        resolution = RESOLUTION_PRESETS[resolution]
+    elif not isinstance(resolution, (list, tuple)):
+        raise ValueError(f"Resolution must be a preset name or a list of [until, step] segments, got {resolution!r}")
+
+    if not resolution:
+        raise ValueError("Resolution schedule must have at least one segment")
+
+    strides = []
+    start = 0
+    for segment in resolution:
+        try:
+            until, step = segment
+            until = horizon if until is None else min(int(until), horizon)
+            step = int(step)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"Invalid resolution segment: {segment}")
+        if step < 1 or until <= start:
+            raise ValueError(f"Invalid resolution segment: {list(segment)}")
+
+        full_steps, remainder = divmod(until - start, step)
+        strides.extend([step] * full_steps + ([remainder] if remainder else []))
+        start = until
+        if start == horizon:
+            break
+
+    # Anything the schedule doesn't cover is forecast at its last step
+    if start < horizon:
+        full_steps, remainder = divmod(horizon - start, step)
+        strides.extend([step] * full_steps + ([remainder] if remainder else []))
+
+    return np.array(strides, dtype=int)
+
+def resolution_key(strides: np.ndarray) -> str:
+    """Compact identifier of a step schedule, e.g. "1x90-5x32-2x1-21x168"."""
+    change_points = np.flatnonzero(np.diff(strides)) + 1
+    runs = np.split(strides, change_points)
+    return "-".join(f"{run[0]}x{len(run)}" for run in runs)
+
+def ticker_generator(seed: int, symbol: str) -> torch.Generator:
+    """
+    Generator for one ticker's GBM noise in a request.
+
+    The stream is derived from the request seed and the ticker symbol only, so a
+    ticker's forecast is reproducible whatever other tickers it is batched with
+    and however many requests run at the same time.
+    """
+    return torch.Generator().manual_seed((seed * 1_000_003 + zlib.crc32(symbol.encode())) % (2**63))
+
+def predict_future(model, last_sequence, steps, scaler_diff, current_price, generator=None):
+    """Predict future values using trained model and GBM."""
+    future_prices = predict_future_batch(
+        model, last_sequence.unsqueeze(0), steps, scaler_diff, np.array([current_price]), generator
+    )
+    return future_prices[0].reshape(-1, 1)
+
+def predict_future_batch(model, last_sequences, steps, scaler_diff, current_prices, generator=None):
+    """
+    Predict future values for several tickers at once using the trained model and GBM.
+
+    All trajectories are stepped together, so each step costs a single forward pass
+    regardless of how many tickers are being forecast.
+
+    Args:
+        model: Trained BiLSTM model
+        last_sequences: Tensor of shape (N, seq_length, 1) with the scaled differences
+        steps: Number of future steps to predict
+        scaler_diff: Scaler used for the differenced data
+        current_prices: Array of shape (N,) with the last observed price of each ticker
+        generator: Optional torch.Generator for the GBM noise, or one per ticker
+
+    Returns:
+        Array of shape (N, steps) with the predicted prices
+    """
+    kernel = ForecastKernel(model, scaler_diff)
+    return kernel.run(last_sequences, steps, current_prices, generator)
+
+def fetch_and_prepare_data(ticker_symbol: str, seq_length: int, df: pd.DataFrame = None) -> Tuple[np.ndarray, float, np.ndarray, np.ndarray]:
+    """
+    Fetch ticker data (unless already fetched) and prepare it for prediction.
+
+    Without `df`, the closes and their differences are the OHLCV store's
+    memory-mapped arrays, so only the last window of differences is read and
+    the history itself is never copied.
+
+    Returns:
+        Tuple of the last seq_length differences as a (seq_length, 1) column
+        (zero-padded at the top for short histories), the last close, the
+        datetime64[D] bar dates and the closes
+    """
+    if df is None:
+        arrays = ohlcv_store.arrays(ticker_symbol)
+        if arrays is None or not len(arrays):
+            raise ValueError(f"No 'Close' price data available for {ticker_symbol}")
+        dates, close_prices, diff_close_prices = arrays.dates, arrays.close, arrays.diff
+    else:
+        # Make sure the data has a Close column
+        if 'Close' not in df.columns:
+            raise ValueError(f"No 'Close' price data available for {ticker_symbol}")
+        close_prices = df['Close'].values.astype(float)
+        diff_close_prices = np.diff(close_prices)
+        dates = day_array(df.index)
+
+    # Get the last price (for starting predictions)
+    last_price = float(close_prices[-1])
+
+    # If we don't have enough data for the sequence length, pad with zeros
+    window = diff_close_prices[-seq_length:]
+    if len(window) < seq_length:
+        window = np.concatenate([np.zeros(seq_length - len(window)), window])
+
+    return window.reshape(-1, 1), last_price, dates, close_prices
+
+def iter_stock_prices(
+    ticker_symbols: List[str],
+    bundle,
+    seed: int = DEFAULT_SEED,
+    n_paths: int = 1,
+    horizon: int = DEFAULT_HORIZON,
+    resolution="daily",
+    progress=None,
+    history: Dict[str, pd.DataFrame] = None,
+    formatter=records_payload
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Forecast tickers like predict_stock_prices, yielding (symbol, result) pairs as they finish.
+
+    Tickers that fail to fetch are yielded first, then tickers served from the
+    forecast store, then the ones the model had to run for. Arguments are the
+    same as for predict_stock_prices.
+    """
+    model = bundle.model
+    scaler_diff = bundle.scaler_diff
+    seq_length = bundle.seq_length
+
+    # Length of every forecast step and the trading-day offset each one lands on
+    strides = resolution_strides(resolution, horizon)
+    offsets = np.cumsum(strides)
+
+    def report(symbol, state, result=None):
+        if progress is not None:
+            progress(symbol, state, result)
+
+    def format_result(symbol, symbol_future_prices):
+        _, _, historical_dates, closes = prepared[symbol]
+
+        # Map every forecast step to its trading day on the ticker's exchange
+        last_date = historical_dates[-1]
+        future_dates = future_trading_days(exchange_for_symbol(symbol), last_date, offsets)
+
+        # Get historical dates for as far back as the horizon or as many as available,
+        # sampled with the forecast's schedule mirrored into the past
+        past_days = min(len(historical_dates), horizon)
+        past_positions = len(historical_dates) - 1 - np.concatenate([[0], offsets])
+        past_positions = past_positions[past_positions >= len(historical_dates) - past_days][::-1]
+        historical_subset = historical_dates[past_positions]
+        historical_prices = closes[past_positions]
+
+        # Combine historical and future data
+        all_dates = np.concatenate([day_array(historical_subset), future_dates])
+
+        if n_paths > 1:
+            # Future points carry every percentile band, with the median as the value
+            bands = {f"p{q}": values for q, values in zip(ENSEMBLE_QUANTILES, symbol_future_prices)}
+            no_bands = np.full(len(historical_prices), np.nan)
+            columns = {"value": np.concatenate([historical_prices, bands["p50"]])}
+            columns.update({name: np.concatenate([no_bands, values]) for name, values in bands.items()})
+        else:
+            columns = {"value": np.concatenate([historical_prices, symbol_future_prices])}
+
+        return formatter(Series(all_dates, columns))
+
+    def finish(symbol, symbol_future_prices):
+        try:
+            result = format_result(symbol, symbol_future_prices)
+            report(symbol, "done", result)
+        except Exception as e:
+            print(f"Error processing {symbol}: {str(e)}")
+            result = {"error": str(e)}
+            report(symbol, "error", result)
+        return symbol, result
+
+    # Fetch and prepare data for every ticker before forecasting
+    prepared = {}
+    for symbol in ticker_symbols:
+        report(symbol, "fetching")
+        try:
+            diff_window, last_price, historical_dates, closes = fetch_and_prepare_data(
+                symbol, seq_length, (history or {}).get(symbol)
+            )
+
+            # Scale the differenced data
+            diff_scaled = scaler_diff.transform(diff_window)
+
+            prepared[symbol] = (diff_scaled, last_price, historical_dates, closes)
+        except Exception as e:
+            print(f"Error processing {symbol}: {str(e)}")
+            result = {"error": str(e)}
+            report(symbol, "error", result)
+            yield symbol, result
+
+    # Serve stored forecasts straight away and only run the model for the rest
+    store_keys = {}
+    symbols = []
+    for symbol, (_, _, historical_dates, _) in prepared.items():
+        last_bar_date = str(historical_dates[-1])
+        store_keys[symbol] = (symbol, bundle.fingerprint, last_bar_date, horizon, seed, n_paths, resolution_key(strides))
+        cached = forecast_store.get(store_keys[symbol])
+        if cached is not None:
+            yield finish(symbol, cached)
+        else:
+            symbols.append(symbol)
+
+    for symbol in symbols:
+        report(symbol, "forecasting")
+    if symbols:
+        # Stack every ticker's last sequence into one batch
+        last_diff_sequences = torch.tensor(
+            np.stack([prepared[symbol][0] for symbol in symbols]), dtype=torch.float32
+        )
+        last_prices = np.array([prepared[symbol][1] for symbol in symbols])
+        generators = [ticker_generator(seed, symbol) for symbol in symbols]
+
+        # Predict future prices for all tickers together
+        kernel = ForecastKernel(model, scaler_diff)
+        if n_paths > 1:
+            future_prices = kernel.run(
+                last_diff_sequences, len(strides), last_prices, generators,
+                n_paths=n_paths, quantiles=ENSEMBLE_QUANTILES, strides=strides
+            )
+        else:
+            future_prices = kernel.run(last_diff_sequences, len(strides), last_prices, generators, strides=strides)
+
+        for symbol, symbol_future_prices in zip(symbols, future_prices):
+            forecast_store.put(store_keys[symbol], symbol_future_prices)
+            yield finish(symbol, symbol_future_prices)
+
+def predict_stock_prices(
+    ticker_symbols: List[str],
+    bundle,
+    seed: int = DEFAULT_SEED,
+    n_paths: int = 1,
+    horizon: int = DEFAULT_HORIZON,
+    resolution="daily",
+    progress=None,
+    history: Dict[str, pd.DataFrame] = None,
+    formatter=records_payload
+) -> Dict[str, Any]:
+    """
+    Predict stock prices for multiple ticker symbols for -15 to +15 years.
+
+    Forecasts already in the forecast store for the same model, last bar, horizon
+    and seed are reused. The last sequence of every remaining ticker is stacked
+    into a single (N, seq_length, 1) batch so they are forecast together.
+
+    The GBM noise of every ticker comes from its own generator seeded from `seed`
+    and the symbol (see ticker_generator), and no global RNG state is touched, so
+    requests can run concurrently in threads and stay reproducible.
+
+    With n_paths > 1 a Monte Carlo ensemble of GBM paths is simulated for every
+    ticker and each future point carries the ENSEMBLE_QUANTILES percentile bands,
+    with the median as its value.
+
+    A coarser resolution schedule forecasts the far horizon in multi-day steps and
+    thins the returned history with the same schedule going backwards, which cuts
+    both the model steps and the payload.
+
+    Args:
+        ticker_symbols: List of ticker symbols to predict
+        bundle: Loaded model, scaler and metadata from the model registry
+        seed: Seed of the request's random streams for the stochastic part of the forecast
+        n_paths: Number of sample paths to simulate per ticker
+        horizon: Number of trading days to forecast
+        resolution: Resolution schedule (see resolution_strides)
+        progress: Optional callback called as progress(symbol, state, result=None)
+            when a ticker moves between the fetching, forecasting, done and error states
+        history: Optional daily price history already fetched for some of the tickers
+        formatter: Lays out every ticker's Series (see series_format); the default
+            is the list of {"date", "value"} points
+
+    Returns:
+        Dictionary with ticker symbols as keys and arrays of dates and prices as values
+    """
+    result = dict(iter_stock_prices(
+        ticker_symbols, bundle, seed, n_paths, horizon, resolution, progress, history, formatter
+    ))
+
+    # Keep the response in the order the tickers were requested
+    return {symbol: result[symbol] for symbol in ticker_symbols if symbol in result}
@@ -0,0 +1,87 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+from app import config
+from app.services.providers import market_data_provider
+from app.services.single_flight import upstream_calls
+from app.services.upstream import upstream
+
+
+class FundamentalsCache:
+    """
+    yfinance Ticker.info per symbol, shared by every endpoint that shows fundamentals.
+
+    Entries younger than `ttl` seconds are served as they are. Older ones are
+    still served straight away while a background thread fetches a fresh copy
+    (stale-while-revalidate), so a request only waits on Yahoo for a symbol it
+    has never seen or one not refreshed for `max_stale` seconds. At most
+    `max_entries` symbols are kept, least recently used first out.
+    """
+
+    def __init__(self, ttl: float, max_stale: float, max_entries: int, workers: int):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fundamentals")
+
+    def _remember(self, symbol: str, info: Dict[str, Any]):
+        with self._lock:
+            self._entries[symbol] = (time.monotonic(), info)
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _fetch(self, symbol: str) -> Dict[str, Any]:
+        # Concurrent misses and refreshes of a symbol share one scrape
+        info = upstream_calls.do(
+            ("yahoo_info", symbol), upstream.call, market_data_provider.host, market_data_provider.info, symbol,
+            is_request_error=market_data_provider.is_request_error
+        )
+        self._remember(symbol, info)
+        return info
+
+    def _refresh(self, symbol: str):
+        try:
+            self._fetch(symbol)
+        except Exception as e:
+            logging.warning(f"Background refresh of {symbol} fundamentals failed, keeping the cached copy: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(symbol)
+
+    def get(self, symbol: str) -> Dict[str, Any]:
+        """Ticker.info of a symbol. Raises whatever yfinance raises when it has to be fetched and that fails."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                self._entries.move_to_end(symbol)
+                age = now - entry[0]
+                if age < self.ttl:
+                    return entry[1]
+                if age < self.max_stale:
+                    if symbol not in self._refreshing:
+                        self._refreshing.add(symbol)
+                        self._executor.submit(self._refresh, symbol)
+                    return entry[1]
+
+        return self._fetch(symbol)
+
+    def invalidate(self, symbol: str):
+        with self._lock:
+            self._entries.pop(symbol, None)
+
+
+fundamentals_cache = FundamentalsCache(
+    config.FUNDAMENTALS_TTL,
+    config.FUNDAMENTALS_MAX_STALE,
+    config.FUNDAMENTALS_CACHE_SIZE,
+    config.FUNDAMENTALS_REFRESH_WORKERS,
+)
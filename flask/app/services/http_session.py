@@ -0,0 +1,17 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import config
+
+
+def pooled_session(pool_size: int) -> requests.Session:
+    """requests Session keeping up to `pool_size` connections per host alive for reuse."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# One keep-alive connection pool shared by the concurrent Yahoo Finance requests
+market_session = pooled_session(config.MARKET_DATA_WORKERS)
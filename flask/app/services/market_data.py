@@ -0,0 +1,84 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app import config
+from app.services.finance_utils import convert_to_yfinance_symbol
+from app.services.fundamentals import fundamentals_cache
+from app.services.providers import market_data_provider
+from app.services.single_flight import upstream_calls
+from app.services.upstream import upstream
+
+
+def last_prices(symbols: List[str]) -> Dict[str, float]:
+    """Latest daily close of every symbol, from one multi-symbol download."""
+    if not symbols:
+        return {}
+    # Portfolio endpoints loaded together download the same symbols only once
+    data = upstream_calls.do(
+        ("yahoo_prices", tuple(sorted(symbols))),
+        upstream.call, market_data_provider.host, market_data_provider.download, symbols, period='5d', interval='1d',
+        group_by='ticker', threads=True, progress=False, is_request_error=market_data_provider.is_request_error
+    )
+    prices = {}
+    for symbol in symbols:
+        if isinstance(data.columns, pd.MultiIndex):
+            if symbol not in data.columns.get_level_values(0):
+                continue
+            closes = data[symbol]['Close'].dropna()
+        else:
+            closes = data['Close'].dropna()
+        if len(closes):
+            prices[symbol] = float(closes.iloc[-1])
+    return prices
+
+
+def fetch_fundamentals(symbols: List[str], workers: int = config.MARKET_DATA_WORKERS) -> Dict[str, Dict[str, Any]]:
+    """
+    Ticker.info of every symbol through the fundamentals cache, at most `workers` at a time.
+    Symbols whose fundamentals can't be fetched get an empty dict.
+    """
+    def fetch(symbol):
+        try:
+            return fundamentals_cache.get(symbol)
+        except Exception as e:
+            logging.warning(f"Fundamentals of {symbol} unavailable: {e}")
+            return {}
+
+    if not symbols:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(symbols))) as executor:
+        return dict(zip(symbols, executor.map(fetch, symbols)))
+
+
+def fetch_holdings_market_data(holdings: List[Dict[str, Any]]) -> List[Dict[str, Optional[Any]]]:
+    """
+    Market data of every broker holding, in the order of `holdings`.
+
+    Prices come from a single multi-symbol download and fundamentals are fetched
+    concurrently, so a portfolio takes about as long as its slowest symbol
+    rather than the sum of all of them. Holdings of the same symbol share one fetch.
+
+    Args:
+        holdings: Holdings as returned by the broker API, with a 'tradingsymbol'
+
+    Returns:
+        One dict per holding with the yfinance 'symbol', its 'info' (empty when
+        unavailable) and its latest daily close as 'price' (None when unavailable)
+    """
+    symbols = [convert_to_yfinance_symbol(holding['tradingsymbol']) for holding in holdings]
+    unique_symbols = list(dict.fromkeys(symbols))
+
+    # The price download runs alongside the fundamentals fetches
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        prices_future = executor.submit(last_prices, unique_symbols)
+        infos = fetch_fundamentals(unique_symbols)
+        try:
+            prices = prices_future.result()
+        except Exception as e:
+            logging.warning(f"Bulk price download failed: {e}")
+            prices = {}
+
+    return [{"symbol": symbol, "info": infos.get(symbol, {}), "price": prices.get(symbol)} for symbol in symbols]
@@ -0,0 +1,91 @@
+import copy
+import os
+import logging
+from typing import Dict
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from app.services.forecasting import ForecastKernel, model_device
+
+# Inference backends the serving path can run the BiLSTM with
+INFERENCE_BACKENDS = ("eager", "torchscript", "int8")
+
+
+def script_model(model: nn.Module) -> torch.jit.ScriptModule:
+    """Compile the fp32 model to TorchScript."""
+    model = copy.deepcopy(model).cpu().eval()
+    return torch.jit.script(model)
+
+
+def quantize_model(model: nn.Module) -> torch.jit.ScriptModule:
+    """Dynamically quantize the LSTM and Linear layers to int8 and compile the result."""
+    model = copy.deepcopy(model).cpu().eval()
+    quantized = torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    return torch.jit.script(quantized)
+
+
+def export_path(model_path: str, backend: str) -> str:
+    """Where the exported variant of a checkpoint lives, e.g. bilstm_stock_model_new.int8.pt."""
+    return f"{os.path.splitext(model_path)[0]}.{backend}.pt"
+
+
+def build_backend(model: nn.Module, backend: str, model_path: str = None) -> nn.Module:
+    """
+    Return the model to serve for a backend.
+
+    An exported artifact next to the checkpoint is used when it is newer than the
+    checkpoint; otherwise the variant is built from the eager model in-process.
+    TorchScript and int8 variants always run on the CPU.
+    """
+    if backend == "eager":
+        return model
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}. Allowed: {', '.join(INFERENCE_BACKENDS)}")
+
+    if model_path is not None:
+        path = export_path(model_path, backend)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(model_path):
+            logging.info(f"Loading exported {backend} model from {path}")
+            return torch.jit.load(path, map_location='cpu').eval()
+
+    return script_model(model) if backend == "torchscript" else quantize_model(model)
+
+
+def compare_forecasts(reference: nn.Module, candidate: nn.Module, scaler_diff, seq_length: int,
+                      steps: int = 60, batch_size: int = 4, seed: int = 0) -> Dict[str, float]:
+    """
+    Forecast the same windows with two models and the same GBM noise.
+
+    Returns the largest absolute difference between the scaled one-step outputs and
+    the largest relative difference between the forecast price paths.
+    """
+    rng = np.random.default_rng(seed)
+    windows = torch.tensor(rng.uniform(0, 1, size=(batch_size, seq_length, 1)), dtype=torch.float32)
+    prices = rng.uniform(50, 500, size=batch_size)
+
+    with torch.inference_mode():
+        reference_step = reference(windows.to(model_device(reference))).cpu()
+        candidate_step = candidate(windows.to(model_device(candidate))).cpu()
+        step_diff = (reference_step - candidate_step).abs().max().item()
+
+    paths = []
+    for model in (reference, candidate):
+        generator = torch.Generator().manual_seed(seed)
+        paths.append(ForecastKernel(model, scaler_diff).run(windows, steps, prices, generator))
+
+    path_diff = np.max(np.abs(paths[0] - paths[1]) / np.abs(paths[0]))
+    return {"max_step_abs_diff": float(step_diff), "max_path_rel_diff": float(path_diff)}
+
+
+def verify_backend(reference: nn.Module, candidate: nn.Module, scaler_diff, seq_length: int,
+                   tolerance: float, steps: int = 60) -> Dict[str, float]:
+    """Compare a backend against the fp32 eager model, raising ValueError beyond the tolerance."""
+    report = compare_forecasts(reference, candidate, scaler_diff, seq_length, steps)
+    if report["max_path_rel_diff"] > tolerance:
+        raise ValueError(
+            f"Forecasts differ from the eager model by {report['max_path_rel_diff']:.4%} "
+            f"(tolerance {tolerance:.4%})"
+        )
+    return report
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, NamedTuple, Optional
+
+import joblib
+import torch
+
+from app import config
+from app.services.forecasting import BiLSTMModel
+from app.services.model_export import build_backend, verify_backend
+
+
+class ModelBundle(NamedTuple):
+    """A loaded checkpoint together with the scaler and metadata it was trained with."""
+    version: str
+    model: BiLSTMModel
+    scaler_diff: Any
+    metadata: Dict[str, Any]
+    seq_length: int
+    mtimes: Dict[str, float]
+    backend: str = "eager"
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies this exact load of the version, changing whenever its files or backend change."""
+        backend = "" if self.backend == "eager" else f"-{self.backend}"
+        return f"{self.version}{backend}-{int(max(self.mtimes.values()))}"
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded model versions.
+
+    Each version is loaded from disk once and kept warm. When one of its files
+    changes on disk the first request to notice it reloads the version and swaps
+    it in atomically, so callers always see a complete bundle.
+    """
+
+    def __init__(self, versions: Dict[str, Dict[str, str]], model_dir: str,
+                 default_version: str, reload_interval: float = 5.0,
+                 backend: str = "eager", tolerance: float = 0.01):
+        self.versions = versions
+        self.model_dir = model_dir
+        self.default_version = default_version
+        self.reload_interval = reload_interval
+        self.backend = backend
+        self.tolerance = tolerance
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+        self._bundles: Dict[str, ModelBundle] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, version: str) -> Dict[str, str]:
+        return {kind: os.path.join(self.model_dir, filename) for kind, filename in self.versions[version].items()}
+
+    def _mtimes(self, version: str) -> Dict[str, float]:
+        return {kind: os.path.getmtime(path) for kind, path in self._paths(version).items()}
+
+    def _load(self, version: str) -> ModelBundle:
+        paths = self._paths(version)
+        mtimes = self._mtimes(version)
+
+        metadata = joblib.load(paths['metadata'])
+
+        model = BiLSTMModel().to(self.device)
+        model.load_state_dict(torch.load(paths['model'], map_location=self.device))
+        model.eval()
+
+        scaler_diff = joblib.load(paths['scaler'])
+
+        # Swap in the configured backend if its forecasts match the eager model's
+        backend = self.backend
+        if backend != "eager":
+            try:
+                candidate = build_backend(model, backend, paths['model'])
+                report = verify_backend(model, candidate, scaler_diff, metadata['seq_length'], self.tolerance)
+                logging.info(f"Serving {version} with the {backend} backend: {report}")
+                model = candidate
+            except Exception as e:
+                logging.error(f"Falling back to the eager model for {version}, {backend} backend failed: {e}")
+                backend = "eager"
+
+        logging.info(f"Loaded model version {version} from {paths['model']}")
+        return ModelBundle(version, model, scaler_diff, metadata, metadata['seq_length'], mtimes, backend)
+
+    def resolve(self, version: Optional[str] = None) -> str:
+        """Return the version name to use, raising KeyError for unknown versions."""
+        version = version or self.default_version
+        if version not in self.versions:
+            raise KeyError(f"Unknown model version: {version}")
+        return version
+
+    def get(self, version: Optional[str] = None) -> ModelBundle:
+        """Return the loaded bundle for a version, loading or reloading it if needed."""
+        version = self.resolve(version)
+        bundle = self._bundles.get(version)
+
+        now = time.monotonic()
+        if bundle is not None and now - self._last_checked.get(version, 0) < self.reload_interval:
+            return bundle
+
+        with self._lock:
+            # Another thread may have (re)loaded the version while we waited
+            bundle = self._bundles.get(version)
+            try:
+                if bundle is None or bundle.mtimes != self._mtimes(version):
+                    bundle = self._load(version)
+                    self._bundles[version] = bundle
+            except Exception as e:
+                if bundle is None:
+                    raise
+                # Keep serving the previous bundle if the new files can't be loaded
+                logging.error(f"Failed to reload model version {version}: {e}")
+            self._last_checked[version] = time.monotonic()
+
+        return bundle
+
+    def warm(self, *versions: str):
+        """Load the given versions (or every known version) ahead of the first request."""
+        for version in versions or self.versions:
+            try:
+                self.get(version)
+            except Exception as e:
+                logging.error(f"Failed to load model version {version}: {e}")
+
+
+model_registry = ModelRegistry(
+    config.MODEL_VERSIONS,
+    config.MODEL_DIR,
+    config.DEFAULT_MODEL_VERSION,
+    config.MODEL_RELOAD_INTERVAL,
+    config.INFERENCE_BACKEND,
+    config.INFERENCE_TOLERANCE,
+)
@@ -0,0 +1,416 @@
+"""
+Local store of OHLCV bars, one SQLite file per ticker and interval.
+
+The first request for a ticker downloads its whole history once; afterwards
+only the bars from the last completed stored one onwards are fetched, at most
+every `refresh_interval` seconds. The last stored bar may have been stored while
+its session was still open, so it is simply overwritten by the refetched one.
+Bars are stored repaired and adjusted, as yfinance's history(repair=True)
+returns them. Adjusted prices change retroactively on every dividend or split,
+so when the refetched last completed bar no longer matches the stored one, or
+the new bars carry a dividend or split, the ticker's history is downloaded
+again in full.
+
+Daily closes are also kept as memory-mapped arrays (see price_arrays) for
+readers that only need the close series.
+"""
+import os
+import time
+import logging
+import sqlite3
+import threading
+import urllib.parse
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from app import config
+from app.services.price_arrays import PriceArrays, TickerArrays
+from app.services.providers import market_data_provider
+from app.services.single_flight import upstream_calls
+from app.services.upstream import upstream
+
+# Columns stored per bar, as yfinance names them
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+
+# How far back yfinance serves each intraday interval, used for the first download
+INTRADAY_LOOKBACK_DAYS = {'1h': 730, '90m': 60, '30m': 60, '15m': 60, '5m': 60}
+
+# Calendar offsets of the month and year periods
+PERIOD_OFFSETS = {
+    '1mo': relativedelta(months=1),
+    '3mo': relativedelta(months=3),
+    '6mo': relativedelta(months=6),
+    '1y': relativedelta(years=1),
+    '2y': relativedelta(years=2),
+    '3y': relativedelta(years=3),
+    '5y': relativedelta(years=5),
+    '10y': relativedelta(years=10),
+}
+
+# Trading sessions covered by the day periods
+PERIOD_SESSIONS = {'1d': 1, '5d': 5}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ts INTEGER PRIMARY KEY,
+    open REAL, high REAL, low REAL, close REAL, volume REAL, dividends REAL, stock_splits REAL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def bar_rows(df: pd.DataFrame, interval: str) -> List[tuple]:
+    """
+    (ts, open, ..., stock_splits) rows of a yfinance history frame.
+
+    Daily bars are keyed by their local trading date (as epoch seconds of its
+    midnight), since bulk downloads drop the exchange timezone; intraday bars
+    by their time in UTC.
+    """
+    if df.empty:
+        return []
+    df = df.dropna(subset=['Close'])
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None) if interval == '1d' else index.tz_convert('UTC').tz_localize(None)
+    ts = np.asarray(index, dtype='datetime64[s]').astype(np.int64)
+    values = df.reindex(columns=OHLCV_COLUMNS).fillna(0.0).values.astype(float)
+    return [(int(t), *row) for t, row in zip(ts.tolist(), values.tolist())]
+
+
+class OHLCVStore:
+    """
+    OHLCV bars per (ticker, interval) in DATA_DIR/ohlcv, kept up to date incrementally.
+
+    history() refreshes a ticker when its bars are older than `refresh_interval`
+    seconds and then slices the requested period from disk. When a refresh
+    fails, the bars already stored are served.
+    """
+
+    def __init__(self, directory: str, refresh_interval: float):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        # Daily closes and differences as memory-mappable arrays, rewritten on every daily write
+        self.price_arrays = PriceArrays(os.path.join(directory, "arrays"))
+        self._locks: Dict[tuple, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.directory, interval, f"{urllib.parse.quote(symbol, safe='')}.sqlite")
+
+    def _connect(self, symbol: str, interval: str, create: bool = False) -> Optional[sqlite3.Connection]:
+        """
+        Open a ticker's database for writing, or None when it doesn't exist and
+        `create` isn't set. Databases are only created once a fetch returned bars,
+        so requests for unknown symbols leave nothing on disk.
+        """
+        path = self._path(symbol, interval)
+        if not create and not os.path.exists(path):
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _connect_readonly(self, symbol: str, interval: str) -> Optional[sqlite3.Connection]:
+        """Open an existing ticker database read-only, or None when there is none."""
+        path = self._path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        # The file name is percent-quoted already, so quote it again for the URI
+        return sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True, timeout=30)
+
+    def _lock(self, symbol: str, interval: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault((symbol, interval), threading.Lock())
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _last_bar(conn: sqlite3.Connection):
+        return conn.execute("SELECT ts, close FROM bars ORDER BY ts DESC LIMIT 1").fetchone()
+
+    @staticmethod
+    def _anchor_bar(conn: sqlite3.Connection):
+        """
+        (ts, close, last_ts): the last completed stored bar, which refetched bars are
+        checked against, and the key of the last stored bar, or None without bars.
+
+        The last stored bar may have been stored mid-session with a close that has
+        moved since, so the bar before it is the anchor (the only bar when there is one).
+        """
+        rows = conn.execute("SELECT ts, close FROM bars ORDER BY ts DESC LIMIT 2").fetchall()
+        if not rows:
+            return None
+        return rows[-1][0], rows[-1][1], rows[0][0]
+
+    def _write(self, symbol: str, conn: sqlite3.Connection, df: pd.DataFrame, interval: str, replace: bool = False):
+        """Store a yfinance history frame, replacing every stored bar if `replace`."""
+        with conn:
+            if replace:
+                conn.execute("DELETE FROM bars")
+            conn.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)", bar_rows(df, interval))
+            timezone = getattr(df.index, 'tz', None)
+            if timezone is not None:
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('timezone', ?)", (str(timezone),))
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('fetched_at', ?)", (str(time.time()),))
+        if interval == '1d':
+            self._export_arrays(symbol, conn)
+
+    def _export_arrays(self, symbol: str, conn: sqlite3.Connection):
+        """Rewrite the ticker's memory-mappable daily arrays from its stored bars."""
+        rows = np.array(conn.execute("SELECT ts, close FROM bars ORDER BY ts").fetchall(), dtype=float).reshape(-1, 2)
+        if not len(rows):
+            return
+        days = (rows[:, 0].astype(np.int64) // 86400).astype('datetime64[D]')
+        self.price_arrays.write(symbol, days, rows[:, 1])
+
+    @staticmethod
+    def _consistent(anchor_bar, df: pd.DataFrame, interval: str) -> bool:
+        """Whether freshly fetched bars can be written over the stored ones from the anchor bar on."""
+        if anchor_bar is None or df.empty:
+            return True
+        anchor_ts, anchor_close, last_ts = anchor_bar
+        rows = bar_rows(df, interval)
+        overlap = [row for row in rows if row[0] == anchor_ts]
+        if not overlap or not np.isclose(overlap[0][4], anchor_close, rtol=1e-6):
+            return False
+        # A dividend or split after the stored bars re-adjusts everything before it
+        return not any(row[6] or row[7] for row in rows if row[0] > last_ts)
+
+    @staticmethod
+    def _full_fetch_kwargs(interval: str) -> Dict:
+        if interval == '1d':
+            return {'period': 'max'}
+        return {'period': f"{INTRADAY_LOOKBACK_DAYS.get(interval, 60)}d"}
+
+    def _incremental_fetch_kwargs(self, interval: str, last_ts: int) -> Dict:
+        if interval == '1d':
+            return {'start': pd.Timestamp(last_ts, unit='s').strftime('%Y-%m-%d')}
+        last = pd.Timestamp(last_ts, unit='s', tz='UTC')
+        if pd.Timestamp.now(tz='UTC') - last > pd.Timedelta(days=INTRADAY_LOOKBACK_DAYS.get(interval, 60)):
+            return self._full_fetch_kwargs(interval)
+        return {'start': last}
+
+    def refresh(self, symbol: str, interval: str = '1d', force: bool = False):
+        """Fetch the bars from the last completed stored one on (or the whole history for a new ticker)."""
+        def fetch(**kwargs):
+            return upstream.call(
+                market_data_provider.host, market_data_provider.history, symbol, interval=interval,
+                repair=True, is_request_error=market_data_provider.is_request_error, **kwargs
+            )
+
+        with self._lock(symbol, interval):
+            conn = self._connect(symbol, interval)
+            if conn is None:
+                full = fetch(**self._full_fetch_kwargs(interval))
+                if not bar_rows(full, interval):
+                    return
+                conn = self._connect(symbol, interval, create=True)
+                try:
+                    self._write(symbol, conn, full, interval)
+                finally:
+                    conn.close()
+                return
+
+            try:
+                fetched_at = self._meta(conn, 'fetched_at')
+                if not force and fetched_at is not None and time.time() - float(fetched_at) < self.refresh_interval:
+                    return
+
+                anchor_bar = self._anchor_bar(conn)
+                if anchor_bar is None:
+                    full = fetch(**self._full_fetch_kwargs(interval))
+                    self._write(symbol, conn, full, interval)
+                    return
+
+                kwargs = self._incremental_fetch_kwargs(interval, anchor_bar[0])
+                df = fetch(**kwargs)
+                if self._consistent(anchor_bar, df, interval):
+                    self._write(symbol, conn, df, interval)
+                else:
+                    logging.info(f"Adjusted history of {symbol} ({interval}) changed, downloading it again")
+                    full = fetch(**self._full_fetch_kwargs(interval))
+                    self._write(symbol, conn, full, interval, replace=True)
+            finally:
+                conn.close()
+
+    def refresh_many(self, symbols: List[str], interval: str = '1d'):
+        """
+        Refresh several tickers with one bulk download per fetch kind.
+
+        Tickers without bars are downloaded in full and the rest from the oldest
+        of their last completed stored bars. Tickers whose adjusted history
+        changed, or whose bars can't be written, fall back to a refresh() of their own.
+        """
+        stale = {}
+        for symbol in dict.fromkeys(symbols):
+            conn = self._connect(symbol, interval)
+            if conn is None:
+                stale[symbol] = None
+                continue
+            try:
+                fetched_at = self._meta(conn, 'fetched_at')
+                if fetched_at is None or time.time() - float(fetched_at) >= self.refresh_interval:
+                    stale[symbol] = self._anchor_bar(conn)
+            finally:
+                conn.close()
+
+        new = [symbol for symbol, anchor_bar in stale.items() if anchor_bar is None]
+        known = [symbol for symbol, anchor_bar in stale.items() if anchor_bar is not None]
+        batches = []
+        if new:
+            batches.append((new, self._full_fetch_kwargs(interval)))
+        if known:
+            starts = [self._incremental_fetch_kwargs(interval, stale[symbol][0]) for symbol in known]
+            if all('start' in kwargs for kwargs in starts):
+                batches.append((known, {'start': min(kwargs['start'] for kwargs in starts)}))
+            else:
+                batches.append((known, self._full_fetch_kwargs(interval)))
+
+        for batch, kwargs in batches:
+            try:
+                data = upstream.call(market_data_provider.host, market_data_provider.download, batch, interval=interval,
+                                     group_by='ticker', repair=True, auto_adjust=True, actions=True, threads=True,
+                                     progress=False, is_request_error=market_data_provider.is_request_error,
+                                     **kwargs)
+            except Exception as e:
+                logging.warning(f"Bulk download of {len(batch)} tickers failed: {e}")
+                continue
+            for symbol in batch:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        continue
+                    df = data[symbol].dropna(how='all')
+                else:
+                    df = data.dropna(how='all')
+                written = False
+                try:
+                    with self._lock(symbol, interval):
+                        if stale[symbol] is None and not bar_rows(df, interval):
+                            # Nothing to store for a ticker without bars (e.g. an unknown symbol)
+                            continue
+                        conn = self._connect(symbol, interval, create=True)
+                        try:
+                            if self._consistent(stale[symbol], df, interval):
+                                self._write(symbol, conn, df, interval)
+                                written = True
+                        finally:
+                            conn.close()
+                except Exception as e:
+                    logging.warning(f"Storing bulk-downloaded bars of {symbol} ({interval}) failed: {e}")
+                if not written:
+                    try:
+                        self.refresh(symbol, interval, force=True)
+                    except Exception as e:
+                        logging.warning(f"Refreshing {symbol} ({interval}) failed: {e}")
+
+    @staticmethod
+    def _timestamps(ts: np.ndarray, interval: str, timezone: Optional[str]) -> pd.DatetimeIndex:
+        """Bar keys back to a DatetimeIndex in the exchange's timezone (UTC for intraday when unknown)."""
+        if interval == '1d':
+            index = pd.to_datetime(ts, unit='s')
+            return index.tz_localize(timezone) if timezone else index
+        return pd.to_datetime(ts, unit='s', utc=True).tz_convert(timezone or 'UTC')
+
+    @staticmethod
+    def _period_start(last: pd.Timestamp, period: str) -> Optional[pd.Timestamp]:
+        """Earliest bar time of a period ending at the `last` bar, or None for 'max'."""
+        if period == 'max':
+            return None
+        if period in PERIOD_OFFSETS:
+            return last.normalize() - PERIOD_OFFSETS[period]
+        if period == 'ytd':
+            return last.normalize().replace(month=1, day=1)
+        if period in PERIOD_SESSIONS:
+            # Enough calendar days to cover the sessions; callers trim to them
+            return last.normalize() - pd.Timedelta(days=PERIOD_SESSIONS[period] * 2 + 7)
+        raise ValueError(f"Unsupported period: {period}")
+
+    def read(self, symbol: str, period: str = 'max', interval: str = '1d') -> pd.DataFrame:
+        """The stored bars of a period as a yfinance-style frame (empty without any), without refreshing."""
+        conn = self._connect_readonly(symbol, interval)
+        if conn is None:
+            rows, timezone = [], None
+        else:
+            try:
+                timezone = self._meta(conn, 'timezone')
+                last_bar = self._last_bar(conn)
+                since = None
+                if last_bar is not None:
+                    since = self._period_start(self._timestamps(np.array([last_bar[0]]), interval, None)[0], period)
+                query = "SELECT * FROM bars"
+                params = ()
+                if since is not None:
+                    query += " WHERE ts >= ?"
+                    since = since.tz_localize(None) if interval == '1d' else since.tz_convert('UTC').tz_localize(None)
+                    params = ((since - pd.Timestamp(0)) // pd.Timedelta(seconds=1),)
+                rows = conn.execute(query + " ORDER BY ts", params).fetchall()
+            finally:
+                conn.close()
+
+        values = np.array(rows, dtype=float).reshape(-1, len(OHLCV_COLUMNS) + 1)
+        index = self._timestamps(values[:, 0].astype(np.int64), interval, timezone)
+        index.name = 'Date' if interval == '1d' else 'Datetime'
+        df = pd.DataFrame(values[:, 1:], index=index, columns=OHLCV_COLUMNS)
+
+        if period in PERIOD_SESSIONS and len(df):
+            sessions = df.index.normalize()
+            df = df[sessions >= sessions.unique()[-PERIOD_SESSIONS[period]:][0]]
+        return df
+
+    def read_arrays(self, symbol: str, period: str = 'max') -> Optional[TickerArrays]:
+        """Zero-copy views of the stored daily dates, closes and differences of a period, without refreshing."""
+        arrays = self.price_arrays.get(symbol)
+        if arrays is None:
+            # Bars stored before their arrays were written
+            with self._lock(symbol, '1d'):
+                conn = self._connect_readonly(symbol, '1d')
+                if conn is None:
+                    return None
+                try:
+                    self._export_arrays(symbol, conn)
+                finally:
+                    conn.close()
+            arrays = self.price_arrays.get(symbol)
+        if arrays is None or not len(arrays) or period == 'max':
+            return arrays
+        if period in PERIOD_SESSIONS:
+            return arrays.since(arrays.dates[-min(PERIOD_SESSIONS[period], len(arrays))])
+        since = self._period_start(pd.Timestamp(arrays.dates[-1]), period)
+        return arrays.since(np.datetime64(since.date(), 'D'))
+
+    def _refresh_shared(self, symbol: str, interval: str):
+        """refresh(), with concurrent callers for the same ticker and interval sharing one call."""
+        upstream_calls.do(("yahoo_history", symbol, interval), self.refresh, symbol, interval)
+
+    def arrays(self, symbol: str, period: str = 'max') -> Optional[TickerArrays]:
+        """Like read_arrays, after refreshing the ticker's daily bars when they are stale."""
+        try:
+            self._refresh_shared(symbol, '1d')
+        except Exception as e:
+            logging.warning(f"Refreshing {symbol} (1d) failed, serving stored bars: {e}")
+        return self.read_arrays(symbol, period)
+
+    def history(self, symbol: str, period: str = 'max', interval: str = '1d') -> pd.DataFrame:
+        """
+        Bars of a ticker for a period ('5d', '6mo', '1y', 'ytd', 'max', ...), like Ticker.history.
+
+        Periods end at the last stored bar. The ticker is refreshed first when
+        its bars are stale; if that fails, the stored bars are returned as they are.
+        """
+        try:
+            self._refresh_shared(symbol, interval)
+        except Exception as e:
+            logging.warning(f"Refreshing {symbol} ({interval}) failed, serving stored bars: {e}")
+        return self.read(symbol, period, interval)
+
+
+ohlcv_store = OHLCVStore(config.OHLCV_STORE_DIR, config.OHLCV_REFRESH_INTERVAL)
@@ -0,0 +1,96 @@
+"""
+Daily price series as flat binary files, read through np.memmap.
+
+Every ticker has three contiguous little-endian files:
+
+    <symbol>.dates    int64 days since 1970-01-01 (read as datetime64[D])
+    <symbol>.close    float64 closes
+    <symbol>.diff     float32 day-over-day differences of the closes (one shorter)
+
+Readers slice the memory maps instead of copying whole histories, and every
+process mapping the same ticker shares the operating system's page cache.
+Files are replaced atomically, so a reader keeps its old (consistent) mapping
+until it reopens the ticker.
+"""
+import os
+import threading
+import urllib.parse
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+FILE_DTYPES = {"dates": "<i8", "close": "<f8", "diff": "<f4"}
+
+
+class TickerArrays:
+    """Memory-mapped dates, closes and differences of one ticker (or zero-copy slices of them)."""
+
+    def __init__(self, dates: np.ndarray, close: np.ndarray, diff: np.ndarray):
+        self.dates = dates
+        self.close = close
+        self.diff = diff
+
+    def __len__(self):
+        return len(self.close)
+
+    def since(self, day: np.datetime64) -> "TickerArrays":
+        """Views of the bars on or after `day`."""
+        start = int(np.searchsorted(self.dates, day))
+        # diff[i] is close[i + 1] - close[i], so the differences within the slice start at `start`
+        return TickerArrays(self.dates[start:], self.close[start:], self.diff[start:])
+
+
+class PriceArrays:
+    """Writes and memory-maps the per-ticker array files in `directory`."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Open maps per ticker, with the inode of their files to notice replacements
+        self._maps: Dict[str, Tuple[int, TickerArrays]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str, name: str) -> str:
+        return os.path.join(self.directory, f"{urllib.parse.quote(symbol, safe='')}.{name}")
+
+    def write(self, symbol: str, dates: np.ndarray, closes: np.ndarray):
+        """Replace a ticker's files with its full daily series."""
+        os.makedirs(self.directory, exist_ok=True)
+        closes = np.ascontiguousarray(closes, dtype=FILE_DTYPES["close"])
+        arrays = {
+            "dates": np.asarray(dates, dtype='datetime64[D]').astype(FILE_DTYPES["dates"]),
+            "close": closes,
+            "diff": np.diff(closes).astype(FILE_DTYPES["diff"]),
+        }
+        # The close file goes last: readers check its inode to see the set was replaced
+        for name in ("dates", "diff", "close"):
+            path = self._path(symbol, name)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            arrays[name].tofile(tmp_path)
+            os.replace(tmp_path, path)
+
+    def get(self, symbol: str) -> Optional[TickerArrays]:
+        """The ticker's memory-mapped arrays, or None when it has no files yet."""
+        try:
+            inode = os.stat(self._path(symbol, "close")).st_ino
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._maps.get(symbol)
+        if cached is not None and cached[0] == inode:
+            return cached[1]
+
+        try:
+            maps = {}
+            for name, dtype in FILE_DTYPES.items():
+                path = self._path(symbol, name)
+                # np.memmap can't map empty files
+                maps[name] = np.memmap(path, dtype=dtype, mode='r') if os.path.getsize(path) else np.empty(0, dtype)
+        except (OSError, ValueError):
+            return None
+        arrays = TickerArrays(maps["dates"].view('datetime64[D]'), maps["close"], maps["diff"])
+        if len(arrays.dates) != len(arrays.close) or len(arrays.diff) != max(len(arrays.close) - 1, 0):
+            # Caught between two writes; the next call sees the complete set
+            return None
+        with self._lock:
+            self._maps[symbol] = (inode, arrays)
+        return arrays
@@ -0,0 +1,481 @@
+"""
+Pluggable sources of market data, broker holdings and orders.
+
+Every upstream the app talks to sits behind a small interface with two
+implementations:
+
+- "live" calls Yahoo Finance (yfinance) and Angel One's SmartAPI.
+- "replay" serves recorded responses from REPLAY_DIR and synthesises the rest
+  deterministically per symbol, after a configurable latency, without any
+  network access. It is meant for load tests and offline development.
+
+The implementation is chosen per kind with MARKET_DATA_PROVIDER and
+BROKER_PROVIDER (which also selects the order provider).
+
+Recorded responses (see record_replay.py) are laid out as:
+
+    REPLAY_DIR/history/<interval>/<symbol>.csv    Ticker.history(...).to_csv()
+    REPLAY_DIR/info/<symbol>.json                 Ticker.info
+    REPLAY_DIR/holdings.json                      smart_api.holding() response
+"""
+import os
+import copy
+import json
+import time
+import zlib
+import random
+import threading
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFInvalidPeriodError, YFTickerMissingError
+
+from app import config
+from app.services.http_session import market_session
+from app.services.smart_api_client import get_smart_api
+from app.services.trading_calendar import exchange_for_symbol, trading_days
+
+PROVIDER_KINDS = ("live", "replay")
+
+EXCHANGE_TIMEZONES = {"NYSE": "America/New_York", "NSE": "Asia/Kolkata", "BSE": "Asia/Kolkata"}
+
+# Local open and close of the regular session, for synthetic intraday bars
+EXCHANGE_SESSIONS = {"NYSE": ("09:30", "16:00"), "NSE": ("09:15", "15:30"), "BSE": ("09:15", "15:30")}
+
+# First day of synthetic daily history, and the days of synthetic intraday history
+SYNTHETIC_START = "2005-01-03"
+SYNTHETIC_INTRADAY_DAYS = 60
+
+INTRADAY_FREQUENCIES = {"1h": "60min", "90m": "90min", "30m": "30min", "15m": "15min", "5m": "5min"}
+
+# Holdings of the synthetic broker account when no holdings were recorded
+SYNTHETIC_HOLDINGS = ["RELIANCE-EQ", "TCS-EQ", "INFY-EQ", "HDFCBANK-EQ", "ITC-EQ", "SBIN-EQ", "TATAMOTORS-EQ", "WIPRO-EQ"]
+
+
+class MarketDataProvider:
+    """Price history and fundamentals, with the call signatures of yfinance."""
+
+    # Upstream host name used for rate limits and circuit breaking
+    host = "yahoo"
+
+    def history(self, symbol: str, **kwargs) -> pd.DataFrame:
+        """Like yf.Ticker(symbol).history(**kwargs)."""
+        raise NotImplementedError
+
+    def download(self, symbols: List[str], **kwargs) -> pd.DataFrame:
+        """Like yf.download(symbols, **kwargs)."""
+        raise NotImplementedError
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        """Like yf.Ticker(symbol).info."""
+        raise NotImplementedError
+
+    def is_request_error(self, error: BaseException) -> bool:
+        """Whether an error is about the request (e.g. an unknown symbol) rather than the host being down."""
+        return False
+
+
+class BrokerProvider:
+    """The broker account's holdings, in SmartAPI's response format."""
+
+    host = "smartapi"
+
+    def holding(self) -> Dict[str, Any]:
+        """Like smart_api.holding(): {"status", "message", "data": [holding, ...]}."""
+        raise NotImplementedError
+
+
+class OrderProvider:
+    """Order placement, in SmartAPI's call and response formats."""
+
+    host = "smartapi"
+
+    def place_order(self, params: Dict[str, Any]) -> str:
+        """Like smart_api.placeOrder(params); returns the order id."""
+        raise NotImplementedError
+
+    def modify_order(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Like smart_api.modifyOrder(params), `params` carrying the 'orderid'."""
+        raise NotImplementedError
+
+    def cancel_order(self, order_id: str, variety: str = "NORMAL") -> Dict[str, Any]:
+        """Like smart_api.cancelOrder(order_id, variety)."""
+        raise NotImplementedError
+
+    def order_book(self) -> Dict[str, Any]:
+        """Like smart_api.orderBook()."""
+        raise NotImplementedError
+
+
+class YahooMarketData(MarketDataProvider):
+    """yfinance over the shared pooled session."""
+
+    # yf.download collects its results in module globals (yfinance.shared), so
+    # concurrent downloads would mix up or lose each other's frames
+    _download_lock = threading.Lock()
+
+    def history(self, symbol: str, **kwargs) -> pd.DataFrame:
+        return yf.Ticker(symbol, session=market_session).history(**kwargs)
+
+    def download(self, symbols: List[str], **kwargs) -> pd.DataFrame:
+        with self._download_lock:
+            return yf.download(symbols, session=market_session, **kwargs)
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        return yf.Ticker(symbol, session=market_session).info
+
+    def is_request_error(self, error: BaseException) -> bool:
+        # Missing or delisted symbols, unsupported periods, and Yahoo's 4xx answers other than rate limiting
+        if isinstance(error, (YFTickerMissingError, YFInvalidPeriodError)):
+            return True
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        return status is not None and 400 <= status < 500 and status != 429
+
+
+class SmartApiBroker(BrokerProvider):
+    """Holdings of the SmartAPI account (logged in on first use)."""
+
+    def holding(self) -> Dict[str, Any]:
+        return get_smart_api().holding()
+
+
+class SmartApiOrders(OrderProvider):
+    """Orders through the SmartAPI account (logged in on first use)."""
+
+    def place_order(self, params: Dict[str, Any]) -> str:
+        return get_smart_api().placeOrder(params)
+
+    def modify_order(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return get_smart_api().modifyOrder(params)
+
+    def cancel_order(self, order_id: str, variety: str = "NORMAL") -> Dict[str, Any]:
+        return get_smart_api().cancelOrder(order_id, variety)
+
+    def order_book(self) -> Dict[str, Any]:
+        return get_smart_api().orderBook()
+
+
+class ReplayLatency:
+    """Sleeps `latency` seconds plus up to `jitter` more, like a round-trip to the real upstream."""
+
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+
+    def wait(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RecordedFiles:
+    """Parsed recorded responses, kept in memory and only parsed again when their file changes."""
+
+    def __init__(self):
+        self._files: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, path: str, parse: Callable[[str], Any]) -> Any:
+        """`parse(path)`, cached by the file's mtime; None when the file doesn't exist."""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._files.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+        value = parse(path)
+        with self._lock:
+            self._files[path] = (mtime, value)
+        return value
+
+
+def read_json(path: str) -> Any:
+    with open(path) as f:
+        return json.load(f)
+
+
+def symbol_rng(symbol: str, stream: str = "") -> np.random.Generator:
+    """Random generator seeded from the symbol only, so synthetic data is the same in every process."""
+    return np.random.default_rng(zlib.crc32(f"{symbol}|{stream}".encode()))
+
+
+def synthetic_bars(closes: np.ndarray, rng: np.random.Generator, sigma: float) -> Dict[str, np.ndarray]:
+    """Open/high/low/volume columns around a close path."""
+    opens = np.concatenate([[closes[0]], closes[:-1]])
+    spread = np.abs(rng.standard_normal(len(closes))) * sigma * 0.5
+    return {
+        "Open": opens,
+        "High": np.maximum(opens, closes) * (1 + spread),
+        "Low": np.minimum(opens, closes) * (1 - spread),
+        "Close": closes,
+        "Volume": np.round(rng.lognormal(14, 0.5, len(closes))),
+        "Dividends": np.zeros(len(closes)),
+        "Stock Splits": np.zeros(len(closes)),
+    }
+
+
+def slice_history(df: pd.DataFrame, period: Optional[str] = None, start=None, end=None) -> pd.DataFrame:
+    """Bars of a period ('5d', '6mo', '2y', 'max', ...) ending today, or from `start` to `end`, like yfinance."""
+    def localize(value):
+        value = pd.Timestamp(value)
+        if df.index.tz is None:
+            return value.tz_localize(None) if value.tz is not None else value
+        return value.tz_localize(df.index.tz) if value.tz is None else value.tz_convert(df.index.tz)
+
+    if start is not None or end is not None:
+        if start is not None:
+            df = df[df.index >= localize(start)]
+        if end is not None:
+            df = df[df.index < localize(end)]
+        return df
+    if period in (None, "max") or not len(df):
+        return df
+    now = localize(pd.Timestamp.now(tz="UTC"))
+    if period == "ytd":
+        return df[df.index >= now.normalize().replace(month=1, day=1)]
+    for suffix, unit in (("mo", "months"), ("y", "years"), ("d", "days")):
+        if period.endswith(suffix):
+            count = int(period[:-len(suffix)])
+            return df[df.index >= now.normalize() - pd.DateOffset(**{unit: count})]
+    raise ValueError(f"Unsupported period: {period}")
+
+
+class ReplayMarketData(MarketDataProvider):
+    """
+    Recorded histories and fundamentals from `directory`, with deterministic
+    synthetic ones (a GBM path per symbol on its exchange's trading days) for
+    symbols that weren't recorded.
+    """
+
+    host = "replay"
+
+    def __init__(self, directory: str, latency: ReplayLatency):
+        self.directory = directory
+        self.latency = latency
+        self.recorded = RecordedFiles()
+
+    def _path(self, *parts: str) -> str:
+        *dirs, filename = parts
+        return os.path.join(self.directory, *dirs, urllib.parse.quote(filename, safe=''))
+
+    def _recorded_history(self, symbol: str, interval: str) -> Optional[pd.DataFrame]:
+        def parse(path):
+            df = pd.read_csv(path, index_col=0)
+            timezone = EXCHANGE_TIMEZONES[exchange_for_symbol(symbol)]
+            df.index = pd.to_datetime(df.index, utc=True).tz_convert(timezone)
+            df.index.name = 'Date' if interval == '1d' else 'Datetime'
+            return df
+
+        return self.recorded.load(self._path("history", interval, f"{symbol}.csv"), parse)
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _synthetic_history(symbol: str, interval: str, today: str) -> pd.DataFrame:
+        exchange = exchange_for_symbol(symbol)
+        timezone = EXCHANGE_TIMEZONES[exchange]
+        days = trading_days(exchange)
+        days = days[(days >= np.datetime64(SYNTHETIC_START)) & (days <= np.datetime64(today))]
+        rng = symbol_rng(symbol)
+
+        # Daily closes: GBM from a symbol-specific start price, drift and volatility
+        sigma = rng.uniform(0.01, 0.03)
+        returns = rng.normal(rng.uniform(0.0, 0.0006) - 0.5 * sigma**2, sigma, len(days))
+        closes = rng.uniform(20, 2000) * np.exp(np.cumsum(returns))
+        if interval == '1d':
+            index = pd.DatetimeIndex(days.astype('datetime64[ns]'), name='Date').tz_localize(timezone)
+            return pd.DataFrame(synthetic_bars(closes, rng, sigma), index=index)
+
+        # Intraday: bars through each recent session, starting from that day's daily close
+        frequency = pd.Timedelta(INTRADAY_FREQUENCIES.get(interval, "60min"))
+        session_open, session_close = (pd.Timedelta(f"{t}:00") for t in EXCHANGE_SESSIONS[exchange])
+        bars_per_session = -(-(session_close - session_open) // frequency)
+        offsets = np.array([session_open + frequency * i for i in range(bars_per_session)], dtype='timedelta64[ns]')
+        recent = days[-SYNTHETIC_INTRADAY_DAYS:].astype('datetime64[ns]')
+        stamps = (recent[:, None] + offsets[None, :]).ravel()
+        bar_sigma = sigma / np.sqrt(len(offsets))
+        intraday_rng = symbol_rng(symbol, interval)
+        bar_returns = intraday_rng.normal(0.0, bar_sigma, len(stamps))
+        bar_closes = closes[-SYNTHETIC_INTRADAY_DAYS] * np.exp(np.cumsum(bar_returns))
+        index = pd.DatetimeIndex(stamps, name='Datetime').tz_localize(timezone)
+        return pd.DataFrame(synthetic_bars(bar_closes, intraday_rng, bar_sigma), index=index)
+
+    def _history(self, symbol: str, interval: str) -> pd.DataFrame:
+        df = self._recorded_history(symbol, interval)
+        if df is None:
+            df = self._synthetic_history(symbol, interval, str(np.datetime64('today', 'D')))
+            if interval != '1d':
+                # Today's session only up to now
+                df = df[df.index <= pd.Timestamp.now(tz=df.index.tz)]
+        return df
+
+    def history(self, symbol: str, period: Optional[str] = None, interval: str = '1d', start=None, end=None,
+                **kwargs) -> pd.DataFrame:
+        self.latency.wait()
+        if period is None and start is None:
+            period = "1mo"
+        return slice_history(self._history(symbol, interval), period, start, end).copy()
+
+    def download(self, symbols: List[str], period: Optional[str] = None, interval: str = '1d', start=None, end=None,
+                 group_by: str = 'column', **kwargs) -> pd.DataFrame:
+        self.latency.wait()
+        if isinstance(symbols, str):
+            symbols = symbols.split()
+        if period is None and start is None:
+            period = "max"
+        frames = {}
+        for symbol in symbols:
+            df = slice_history(self._history(symbol, interval), period, start, end).copy()
+            # Like yf.download: daily bars of several exchanges on naive local dates, intraday ones in UTC
+            df.index = df.index.tz_localize(None) if interval == '1d' else df.index.tz_convert('UTC')
+            frames[symbol] = df
+        data = pd.concat(frames, axis=1).sort_index()
+        if group_by != 'ticker':
+            data = data.swaplevel(0, 1, axis=1).sort_index(axis=1)
+        return data
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        self.latency.wait()
+        info = self.recorded.load(self._path("info", f"{symbol}.json"), read_json)
+        if info is not None:
+            return dict(info)
+
+        closes = self._history(symbol, '1d')['Close']
+        rng = symbol_rng(symbol, "info")
+        last = float(closes.iloc[-1])
+        year = closes.iloc[-252:]
+        shares = float(round(rng.uniform(1e8, 5e9)))
+        return {
+            "symbol": symbol,
+            "shortName": symbol.split('.')[0],
+            "longName": f"{symbol.split('.')[0]} Synthetic Ltd",
+            "sector": str(rng.choice(["Technology", "Financial Services", "Energy", "Consumer Defensive", "Healthcare"])),
+            "industry": "Synthetic",
+            "country": "India" if exchange_for_symbol(symbol) != "NYSE" else "United States",
+            "currentPrice": last,
+            "regularMarketPrice": last,
+            "previousClose": float(closes.iloc[-2]),
+            "fiftyTwoWeekHigh": float(year.max()),
+            "fiftyTwoWeekLow": float(year.min()),
+            "marketCap": last * shares,
+            "sharesOutstanding": shares,
+            "trailingPE": float(rng.uniform(8, 60)),
+            "priceToBook": float(rng.uniform(0.8, 12)),
+            "beta": float(rng.uniform(0.4, 1.8)),
+            "dividendYield": float(rng.uniform(0, 0.04)),
+            "profitMargins": float(rng.uniform(0.02, 0.35)),
+            "returnOnEquity": float(rng.uniform(0.02, 0.4)),
+            "revenueGrowth": float(rng.uniform(-0.1, 0.3)),
+            "earningsGrowth": float(rng.uniform(-0.2, 0.4)),
+            "targetMeanPrice": last * float(rng.uniform(0.8, 1.4)),
+            "recommendationKey": str(rng.choice(["buy", "hold", "sell", "strong_buy"])),
+            "numberOfAnalystOpinions": int(rng.integers(3, 40)),
+            "averageVolume": float(round(rng.lognormal(14, 0.5))),
+            "financialCurrency": "INR" if exchange_for_symbol(symbol) != "NYSE" else "USD",
+        }
+
+
+class ReplayBroker(BrokerProvider):
+    """Recorded holdings from `directory`, or a synthetic account holding SYNTHETIC_HOLDINGS."""
+
+    host = "replay"
+
+    def __init__(self, directory: str, latency: ReplayLatency, market_data: ReplayMarketData):
+        self.directory = directory
+        self.latency = latency
+        self.market_data = market_data
+
+    def holding(self) -> Dict[str, Any]:
+        self.latency.wait()
+        holdings = self.market_data.recorded.load(os.path.join(self.directory, "holdings.json"), read_json)
+        if holdings is not None:
+            return copy.deepcopy(holdings)
+
+        from app.services.finance_utils import convert_to_yfinance_symbol
+
+        holdings = []
+        for trading_symbol in SYNTHETIC_HOLDINGS:
+            closes = self.market_data._history(convert_to_yfinance_symbol(trading_symbol), '1d')['Close']
+            rng = symbol_rng(trading_symbol, "holding")
+            ltp = float(closes.iloc[-1])
+            holdings.append({
+                "tradingsymbol": trading_symbol,
+                "exchange": "NSE",
+                "isin": "",
+                "quantity": int(rng.integers(1, 200)),
+                "averageprice": round(ltp * float(rng.uniform(0.6, 1.3)), 2),
+                "ltp": round(ltp, 2),
+                "close": round(float(closes.iloc[-2]), 2),
+                "product": "DELIVERY",
+            })
+        return {"status": True, "message": "SUCCESS", "errorcode": "", "data": holdings}
+
+
+class ReplayOrders(OrderProvider):
+    """An in-memory order book that accepts every order."""
+
+    host = "replay"
+
+    def __init__(self, latency: ReplayLatency):
+        self.latency = latency
+        self._orders: Dict[str, Dict[str, Any]] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def place_order(self, params: Dict[str, Any]) -> str:
+        self.latency.wait()
+        with self._lock:
+            order_id = f"REPLAY{self._next_id:09d}"
+            self._next_id += 1
+            self._orders[order_id] = {**params, "orderid": order_id, "status": "open"}
+        return order_id
+
+    def _update(self, order_id: str, **changes) -> Dict[str, Any]:
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None:
+                return {"status": False, "message": f"Order {order_id} not found", "errorcode": "AB1010", "data": None}
+            order.update(changes)
+        return {"status": True, "message": "SUCCESS", "errorcode": "", "data": {"orderid": order_id}}
+
+    def modify_order(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.latency.wait()
+        return self._update(params.get('orderid'), **params)
+
+    def cancel_order(self, order_id: str, variety: str = "NORMAL") -> Dict[str, Any]:
+        self.latency.wait()
+        return self._update(order_id, status="cancelled")
+
+    def order_book(self) -> Dict[str, Any]:
+        self.latency.wait()
+        with self._lock:
+            orders = [dict(order) for order in self._orders.values()]
+        return {"status": True, "message": "SUCCESS", "errorcode": "", "data": orders}
+
+
+def check_provider(name: str, value: str) -> str:
+    if value not in PROVIDER_KINDS:
+        raise ValueError(f"{name} must be one of: {', '.join(PROVIDER_KINDS)} (got {value!r})")
+    return value
+
+
+replay_latency = ReplayLatency(config.REPLAY_LATENCY, config.REPLAY_LATENCY_JITTER)
+
+if check_provider("MARKET_DATA_PROVIDER", config.MARKET_DATA_PROVIDER) == "replay":
+    market_data_provider: MarketDataProvider = ReplayMarketData(config.REPLAY_DIR, replay_latency)
+else:
+    market_data_provider = YahooMarketData()
+
+if check_provider("BROKER_PROVIDER", config.BROKER_PROVIDER) == "replay":
+    broker_provider: BrokerProvider = ReplayBroker(
+        config.REPLAY_DIR, replay_latency, ReplayMarketData(config.REPLAY_DIR, ReplayLatency(0.0, 0.0))
+    )
+    order_provider: OrderProvider = ReplayOrders(replay_latency)
+else:
+    broker_provider = SmartApiBroker()
+    order_provider = SmartApiOrders()
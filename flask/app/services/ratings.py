@@ -0,0 +1,192 @@
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+
+from app.services.forecasting import ForecastKernel
+from app.services.fundamentals import fundamentals_cache
+from app.services.ohlcv_store import ohlcv_store
+from app.services.price_arrays import TickerArrays
+from app.services.rolling_metrics import RollingMetrics, rolling_metrics
+
+# History the ratings are computed from, and the least a ticker needs (1 year)
+RATINGS_PERIOD = "3y"
+MIN_BARS = 252
+
+# Trading days the BiLSTM projects forward for the predicted return
+PREDICTION_DAYS = 60
+
+# Annualised volatility (%) below which a ticker is low and medium risk
+LOW_RISK_VOLATILITY = 20
+MEDIUM_RISK_VOLATILITY = 35
+
+# Weights of the normalised metrics in the score, and the scores rated 2, 3, 4 and 5 stars
+SCORE_WEIGHTS = {"one_year": 0.30, "six_month": 0.25, "trend": 0.10, "sharpe": 0.30, "future": 0.02}
+RATING_THRESHOLDS = (10, 20, 30, 40)
+
+
+def load_closes(tickers: List[str]) -> Dict[str, TickerArrays]:
+    """Memory-mapped daily dates and closes of the last RATINGS_PERIOD per ticker, refreshed in bulk in the OHLCV store."""
+    ohlcv_store.refresh_many(tickers)
+    closes = {}
+    for symbol in tickers:
+        arrays = ohlcv_store.read_arrays(symbol, period=RATINGS_PERIOD)
+        if arrays is not None and len(arrays):
+            closes[symbol] = arrays
+    return closes
+
+
+def project_returns(bundle, states: List[RollingMetrics]) -> np.ndarray:
+    """
+    Return (%) over the next PREDICTION_DAYS of the BiLSTM's own projection, for every ticker.
+
+    All tickers are projected in one batch from the last closes kept in their
+    rolling state. With a blend weight of 1 the GBM part drops out, leaving the
+    deterministic model path the notebook used.
+    """
+    seq_length = bundle.seq_length
+    # Every rated ticker has at least MIN_BARS bars, so every window is full
+    recent = np.stack([state.recent_closes(seq_length + 1) for state in states])
+    diffs = np.diff(recent, axis=1)
+    windows = bundle.scaler_diff.transform(diffs.reshape(-1, 1)).reshape(-1, seq_length, 1)
+    last_prices = recent[:, -1]
+
+    kernel = ForecastKernel(bundle.model, bundle.scaler_diff, blend_weight=1.0)
+    generator = torch.Generator().manual_seed(0)
+    future_prices = kernel.run(torch.tensor(windows, dtype=torch.float32), PREDICTION_DAYS, last_prices, generator)
+    return (future_prices[:, -1] / last_prices - 1) * 100
+
+
+def rate_states(states: Dict[str, RollingMetrics], bundle=None) -> Dict[str, Dict[str, Any]]:
+    """
+    Risk level, 1-5 star rating and the metrics behind them for every ticker.
+
+    Port of get_stock_ratings (and adjust_ratings) from the Rating-Risk notebook.
+    The volatility, returns and trend come precomputed from each ticker's rolling
+    state, so only the scoring runs per request, column-wise over all tickers.
+    Without a model bundle, or when the projection fails, the predicted return
+    falls back to the last month's momentum extrapolated over two months, as in
+    the notebook.
+
+    Args:
+        states: Rolling metrics of every ticker, each with at least MIN_BARS bars
+        bundle: Optional model bundle from the model registry for the 60-day projection
+
+    Returns:
+        Dictionary with ticker symbols as keys and their risk/rating assessments
+    """
+    symbols = list(states)
+    snapshots = [states[symbol].snapshot() for symbol in symbols]
+
+    def column(name):
+        return np.array([snapshot[name] for snapshot in snapshots])
+
+    # ------- RISK -------
+    volatility_annual = column("volatility_annual")
+    risk_level = np.select(
+        [volatility_annual < LOW_RISK_VOLATILITY, volatility_annual < MEDIUM_RISK_VOLATILITY],
+        ["low", "medium"], "high"
+    )
+
+    # ------- RATING METRICS -------
+    one_year_return = column("one_year_return")
+    six_month_return = column("six_month_return")
+    trend_stability = column("trend_stability")
+    trend_positive = column("trend_slope") > 0
+    sharpe_ratio = column("sharpe_ratio")
+
+    future_return = None
+    if bundle is not None:
+        try:
+            future_return = project_returns(bundle, [states[symbol] for symbol in symbols])
+        except Exception as e:
+            logging.warning(f"Rating projection failed, using momentum instead: {e}")
+    if future_return is None:
+        future_return = np.array([states[symbol].lookback_return(22) for symbol in symbols]) * 2
+
+    # ------- NORMALISATION AND SCORE -------
+    normalized = {
+        "one_year": np.clip(one_year_return / 2 + 50, 0, 100),
+        "six_month": np.clip(six_month_return + 50, 0, 100),
+        # An upward trend scores higher than a downward one of the same stability
+        "trend": np.clip(trend_stability * 100 * np.where(trend_positive, 1.5, 0.5), 0, 100),
+        "sharpe": np.clip(sharpe_ratio * 15 + 40, 0, 100),
+        "future": np.clip(future_return * 3 + 40, 0, 100),
+    }
+    weighted_score = sum(normalized[name] * weight for name, weight in SCORE_WEIGHTS.items())
+    rating = np.digitize(weighted_score, RATING_THRESHOLDS) + 1
+
+    # Cap high-risk tickers with uniformly poor indicators at 2 stars (adjust_ratings)
+    poor = (
+        (risk_level == "high") & (volatility_annual > 1000) & (sharpe_ratio <= 0) & ~trend_positive
+        & (trend_stability < 0.3) & (one_year_return < 0)
+    )
+    rating = np.where(poor, np.minimum(rating, 2), rating)
+
+    metrics = {
+        "volatility_annual": np.round(volatility_annual, 2).tolist(),
+        "one_year_return": np.round(one_year_return, 2).tolist(),
+        "six_month_return": np.round(six_month_return, 2).tolist(),
+        "trend_stability": np.round(trend_stability, 2).tolist(),
+        "sharpe_ratio": np.round(sharpe_ratio, 2).tolist(),
+        "max_drawdown": np.round(column("max_drawdown"), 2).tolist(),
+        "predicted_future_return": np.round(future_return, 2).tolist(),
+        "weighted_score": np.round(weighted_score, 2).tolist(),
+    }
+    results = {}
+    for i, symbol in enumerate(symbols):
+        results[symbol] = {
+            "risk_level": str(risk_level[i]),
+            "rating": int(rating[i]),
+            "metrics": {
+                **{name: values[i] for name, values in metrics.items()},
+                "trend_direction": "positive" if trend_positive[i] else "negative",
+            },
+        }
+    return results
+
+
+def get_stock_ratings(ticker_symbols: List[str], bundle=None, include_info: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Rate tickers from their last RATINGS_PERIOD of daily closes.
+
+    Args:
+        ticker_symbols: List of ticker symbols (e.g. ["AAPL", "MSFT"])
+        bundle: Optional model bundle for the 60-day projection
+        include_info: Also look up each company's name, sector and industry
+
+    Returns:
+        Dictionary with ticker symbols as keys and their risk/rating assessments
+    """
+    ticker_symbols = list(dict.fromkeys(ticker_symbols))
+    closes = load_closes(ticker_symbols)
+
+    results = {}
+    ratable = {}
+    for symbol in ticker_symbols:
+        # Only the bars after the last one seen are folded into the stored state
+        state = rolling_metrics.sync(symbol, closes[symbol].dates, closes[symbol].close) if symbol in closes else None
+        if state is None or state.count < MIN_BARS:
+            results[symbol] = {"error": f"Insufficient historical data for {symbol}"}
+        else:
+            ratable[symbol] = state
+
+    if ratable:
+        results.update(rate_states(ratable, bundle))
+
+    if include_info:
+        for symbol in ratable:
+            company_info = {}
+            try:
+                info = fundamentals_cache.get(symbol)
+                company_info = {
+                    "name": info.get("shortName", ""),
+                    "sector": info.get("sector", ""),
+                    "industry": info.get("industry", "")
+                }
+            except Exception:
+                pass  # Skip if info retrieval fails
+            results[symbol]["company_info"] = company_info
+
+    return {symbol: results[symbol] for symbol in ticker_symbols}
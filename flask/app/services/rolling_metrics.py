@@ -0,0 +1,307 @@
+import os
+import copy
+import threading
+import urllib.parse
+from typing import Dict, Optional
+
+import numpy as np
+
+from app import config
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Return windows (in bars) with running sums for the windowed volatility
+VOLATILITY_WINDOWS = (TRADING_DAYS_PER_YEAR, TRADING_DAYS_PER_YEAR * 3)
+
+# Closes looked back on for the 1-year and 6-month returns, and covered by the trend fit
+ONE_YEAR_BARS = TRADING_DAYS_PER_YEAR
+SIX_MONTH_BARS = 126
+TREND_BARS = 63
+
+# Closes kept in the ring buffer: enough to drop the oldest return of the longest window
+RING_CAPACITY = max(VOLATILITY_WINDOWS) + 2
+
+# Appends after which the windowed sums are recomputed from the ring to shed rounding drift
+RESYNC_INTERVAL = TRADING_DAYS_PER_YEAR
+
+RISK_FREE_RATE = 0.02
+
+
+class RollingMetrics:
+    """
+    Running statistics of one ticker's daily closes, updated in O(1) per new bar.
+
+    Keeps running sums of the returns over each VOLATILITY_WINDOWS window,
+    running sums for a least-squares line through the last TREND_BARS closes,
+    and a ring buffer of the most recent closes for the lookback returns and
+    drawdowns. Every metric covers at most the longest window (3 years, like
+    RATINGS_PERIOD), so it doesn't depend on when the state was first built.
+    """
+
+    def __init__(self):
+        self.last_date: Optional[str] = None
+        self.count = 0
+
+        # Ring buffer of the last RING_CAPACITY closes, oldest at `head`
+        self.ring = np.zeros(RING_CAPACITY)
+        self.head = 0
+        self.size = 0
+
+        # Daily returns appended so far
+        self.n_returns = 0
+
+        # Sum and sum of squares of the returns in each window
+        self.window_sums = np.zeros((len(VOLATILITY_WINDOWS), 2))
+
+        # Sums of y, x*y and y*y over the last TREND_BARS closes, x counting from 0
+        self.trend_sums = np.zeros(3)
+        self.trend_size = 0
+
+        self.appends_since_resync = 0
+
+    def close_ago(self, bars: int) -> float:
+        """Close `bars` bars before the latest one."""
+        return self.ring[(self.head + self.size - 1 - bars) % RING_CAPACITY]
+
+    def recent_closes(self, bars: int) -> np.ndarray:
+        """The last `bars` closes (at most the ring size), oldest first."""
+        bars = min(bars, self.size)
+        positions = (self.head + self.size - bars + np.arange(bars)) % RING_CAPACITY
+        return self.ring[positions]
+
+    def _push(self, close: float):
+        if self.size < RING_CAPACITY:
+            self.ring[(self.head + self.size) % RING_CAPACITY] = close
+            self.size += 1
+        else:
+            self.ring[self.head] = close
+            self.head = (self.head + 1) % RING_CAPACITY
+
+    def append(self, date: str, close: float):
+        """Add the next daily bar."""
+        close = float(close)
+        if self.size:
+            previous = self.close_ago(0)
+            daily_return = close / previous - 1
+
+            self.n_returns += 1
+
+            # Add the new return to every window and drop the one that falls out.
+            # The ring still holds the closes of the outgoing return before the push
+            for i, window in enumerate(VOLATILITY_WINDOWS):
+                self.window_sums[i] += (daily_return, daily_return**2)
+                if self.n_returns > window:
+                    outgoing = self.close_ago(window - 1) / self.close_ago(window) - 1
+                    self.window_sums[i] -= (outgoing, outgoing**2)
+
+        # Slide the trend window: the oldest close leaves and every x shifts down by one
+        if self.trend_size == TREND_BARS:
+            oldest = self.close_ago(TREND_BARS - 1)
+            sum_y, sum_xy, sum_yy = self.trend_sums
+            self.trend_sums = np.array([
+                sum_y - oldest + close,
+                sum_xy - (sum_y - oldest) + (TREND_BARS - 1) * close,
+                sum_yy - oldest**2 + close**2,
+            ])
+        else:
+            self.trend_sums += (close, self.trend_size * close, close**2)
+            self.trend_size += 1
+
+        self._push(close)
+        self.count += 1
+        self.last_date = date
+
+        self.appends_since_resync += 1
+        if self.appends_since_resync >= RESYNC_INTERVAL:
+            self.resync()
+
+    def resync(self):
+        """Recompute the windowed sums from the ring buffer."""
+        closes = self.recent_closes(self.size)
+        returns = np.diff(closes) / closes[:-1]
+        for i, window in enumerate(VOLATILITY_WINDOWS):
+            windowed = returns[-window:]
+            self.window_sums[i] = (windowed.sum(), (windowed**2).sum())
+        trend = closes[-self.trend_size:] if self.trend_size else closes[:0]
+        x = np.arange(len(trend))
+        self.trend_sums = np.array([trend.sum(), (x * trend).sum(), (trend**2).sum()])
+        self.appends_since_resync = 0
+
+    def volatility(self, window: int = max(VOLATILITY_WINDOWS)) -> float:
+        """Annualised volatility (%) of the returns in a window, like np.std over them."""
+        n = min(window, self.n_returns)
+        if n == 0:
+            return 0.0
+        total, total_sq = self.window_sums[VOLATILITY_WINDOWS.index(window)]
+        variance = max(total_sq / n - (total / n) ** 2, 0.0)
+        return float(np.sqrt(variance) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100)
+
+    def window_moments(self, window: int = max(VOLATILITY_WINDOWS)):
+        """Mean and standard deviation of the daily returns in a window."""
+        n = min(window, self.n_returns)
+        if n == 0:
+            return 0.0, 0.0
+        total, total_sq = self.window_sums[VOLATILITY_WINDOWS.index(window)]
+        mean = total / n
+        return float(mean), float(np.sqrt(max(total_sq / n - mean**2, 0.0)))
+
+    def drawdowns(self, window: int = max(VOLATILITY_WINDOWS)):
+        """Deepest and current drawdown (%) from the running peak over the closes of a window of returns."""
+        closes = self.recent_closes(window + 1)
+        if not len(closes):
+            return 0.0, 0.0
+        drawdown = closes / np.maximum.accumulate(closes) - 1
+        return float(drawdown.min() * 100), float(drawdown[-1] * 100)
+
+    def lookback_return(self, bars: int) -> float:
+        """
+        Return (%) to the latest close from closes[-min(bars, count - 1)], as the
+        ratings notebook computes it: `bars` closes back counting the latest one.
+        """
+        return float((self.close_ago(0) / self.close_ago(max(min(bars, self.count - 1) - 1, 0)) - 1) * 100)
+
+    def trend(self):
+        """Slope and R-squared of a least-squares line through the last TREND_BARS closes."""
+        m = self.trend_size
+        sum_y, sum_xy, sum_yy = self.trend_sums
+        sxx = m * (m**2 - 1) / 12
+        sxy = sum_xy - (m - 1) / 2 * sum_y
+        syy = sum_yy - sum_y**2 / m
+        if sxx <= 0:
+            return 0.0, 0.0
+        slope = sxy / sxx
+        r_squared = sxy**2 / (sxx * syy) if syy > 1e-12 * sum_yy else 0.0
+        return float(slope), float(min(r_squared, 1.0))
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current values of every metric."""
+        volatility_annual = self.volatility()
+        one_year_return = self.lookback_return(ONE_YEAR_BARS)
+        slope, r_squared = self.trend()
+        sharpe_ratio = (one_year_return / 100 - RISK_FREE_RATE) / (volatility_annual / 100) if volatility_annual > 0 else 0.0
+        mean, std = self.window_moments()
+        max_drawdown, current_drawdown = self.drawdowns()
+        return {
+            "last_date": self.last_date,
+            "last_close": float(self.close_ago(0)),
+            "bars": self.count,
+            "volatility_annual": volatility_annual,
+            "volatility_1y": self.volatility(TRADING_DAYS_PER_YEAR),
+            "one_year_return": one_year_return,
+            "six_month_return": self.lookback_return(SIX_MONTH_BARS),
+            "trend_slope": slope,
+            "trend_stability": r_squared,
+            "sharpe_ratio": float(sharpe_ratio),
+            "mean_daily_return": mean,
+            "std_daily_return": std,
+            "max_drawdown": max_drawdown,
+            "current_drawdown": current_drawdown,
+        }
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The state as arrays for np.savez."""
+        return {
+            "last_date": np.array(self.last_date or ""),
+            "counters": np.array([self.count, self.head, self.size, self.n_returns,
+                                  self.trend_size, self.appends_since_resync]),
+            "ring": self.ring,
+            "window_sums": self.window_sums,
+            "trend_sums": self.trend_sums,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "RollingMetrics":
+        state = cls()
+        state.last_date = str(arrays["last_date"]) or None
+        (state.count, state.head, state.size, state.n_returns,
+         state.trend_size, state.appends_since_resync) = (int(value) for value in arrays["counters"])
+        state.ring = arrays["ring"].copy()
+        state.window_sums = arrays["window_sums"].copy()
+        state.trend_sums = arrays["trend_sums"].copy()
+        return state
+
+
+class RollingMetricsStore:
+    """
+    Per-ticker RollingMetrics kept in memory and saved as one .npz file per ticker.
+
+    sync() brings a ticker's state up to date with its latest daily closes by
+    appending only the bars after the last one it has seen. The latest bar may
+    belong to a session that is still open, so the kept state stops before it and
+    it is appended to a copy that is returned. The state is rebuilt from the full
+    series when its last bar is missing or its close has changed, e.g. after a
+    dividend or split adjusted the history.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._states: Dict[str, RollingMetrics] = {}
+        self._lock = threading.Lock()
+        # Held across a ticker's get, append and save so concurrent syncs don't append the same bars twice
+        self._symbol_locks: Dict[str, threading.Lock] = {}
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._symbol_locks.setdefault(symbol, threading.Lock())
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.directory, f"{urllib.parse.quote(symbol, safe='')}.npz")
+
+    def get(self, symbol: str) -> Optional[RollingMetrics]:
+        with self._lock:
+            state = self._states.get(symbol)
+        if state is not None:
+            return state
+        try:
+            with np.load(self._path(symbol)) as arrays:
+                state = RollingMetrics.from_arrays(arrays)
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self._states[symbol] = state
+        return state
+
+    def save(self, symbol: str, state: RollingMetrics):
+        with self._lock:
+            self._states[symbol] = state
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(symbol)
+        # Write to a temporary file first so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **state.to_arrays())
+        os.replace(tmp_path, path)
+
+    def sync(self, symbol: str, dates: np.ndarray, closes: np.ndarray) -> RollingMetrics:
+        """Update a ticker's state with its daily closes (and their datetime64[D] dates) and return it."""
+        # Every bar but the latest is final
+        completed = len(closes) - 1
+        with self._symbol_lock(symbol):
+            state = self.get(symbol)
+            start = None
+            if state is not None and state.last_date is not None:
+                last_day = np.datetime64(state.last_date, 'D')
+                position = int(np.searchsorted(dates[:completed], last_day))
+                if (position < completed and dates[position] == last_day
+                        and np.isclose(closes[position], state.close_ago(0), rtol=1e-6)):
+                    start = position + 1
+
+            if start is None:
+                state = RollingMetrics()
+                start = 0
+            if start < completed:
+                # Appended to a copy, swapped in by save(): readers never see a half-updated state
+                state = copy.deepcopy(state)
+                days = np.datetime_as_string(dates[start:completed], unit='D').tolist()
+                for date, close in zip(days, closes[start:completed].tolist()):
+                    state.append(date, close)
+                self.save(symbol, state)
+
+        if completed < 0:
+            return state
+        current = copy.deepcopy(state)
+        current.append(np.datetime_as_string(dates[completed], unit='D'), float(closes[completed]))
+        return current
+
+
+rolling_metrics = RollingMetricsStore(os.path.join(config.DATA_DIR, "metrics"))
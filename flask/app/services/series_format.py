@@ -0,0 +1,160 @@
+"""
+Payload layouts for date-indexed series (forecasts and price history).
+
+"records" is the original list of {"date": ..., "value": ...} points.
+
+"columnar" sends one object per series with the dates once and every value
+column as a plain list, rounded to `precision` decimals:
+
+    {"base": "2010-03-29", "unit": "D", "offsets": [0, 1, 2, 3, 7, ...],
+     "value": [101.25, 102.5, ...], "p5": [...], ...}
+
+where date i is base + offsets[i] units ("D" for days, "s" for seconds, with
+intraday times in UTC), or, with date_encoding="iso",
+{"dates": ["2010-03-29", ...], "value": [...]}. Values missing from a column
+(e.g. percentile bands of history points) are null.
+
+"binary" packs several series into one little-endian buffer:
+
+    uint32      length N of the JSON header
+    N bytes     UTF-8 JSON header, then zero padding to a multiple of 4 bytes
+    data        for every series: int32 offsets[length], then float32 values[length]
+                for every column, in header order
+
+The header is {"series": {key: {"base", "unit", "length", "columns", "offset"}}, ...}
+with `offset` the byte position of the series in the data section. Any extra
+header fields (errors, fundamentals) are passed through.
+"""
+import json
+import struct
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+PAYLOAD_LAYOUTS = ("records", "columnar", "binary")
+DATE_ENCODINGS = ("offsets", "iso")
+
+# Decimals kept in columnar values unless the request asks for another precision
+DEFAULT_PRECISION = 4
+MAX_PRECISION = 8
+
+BINARY_MIMETYPE = "application/octet-stream"
+
+
+class Series:
+    """Dates and named value columns of one series, before they are laid out."""
+
+    def __init__(self, dates: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.dates = np.asarray(dates)
+        self.columns = columns
+
+    @property
+    def unit(self) -> str:
+        # Daily series are sent in days, anything finer in seconds
+        return "D" if np.datetime_data(self.dates.dtype)[0] in ("D", "W", "M", "Y") else "s"
+
+    def offsets(self):
+        """Base date string, unit and the offset of every date from the base."""
+        dates = self.dates.astype(f"datetime64[{self.unit}]")
+        base = dates[0] if len(dates) else np.datetime64("1970-01-01", self.unit)
+        return str(base), self.unit, (dates - base).astype(np.int64)
+
+    def iso_dates(self) -> List[str]:
+        return np.datetime_as_string(self.dates.astype(f"datetime64[{self.unit}]"), unit=self.unit).tolist()
+
+
+def rounded_values(values: np.ndarray, precision: int) -> List:
+    """float32 values rounded to `precision` decimals as a list, with None for NaN/inf."""
+    values = np.asarray(values, dtype=np.float32).astype(np.float64)
+    finite = np.isfinite(values)
+    values = np.round(values, precision).tolist()
+    if not finite.all():
+        values = [value if ok else None for value, ok in zip(values, finite.tolist())]
+    return values
+
+
+def records_payload(series: Series) -> List[Dict[str, Any]]:
+    """
+    The original list of per-point dicts.
+
+    Columns after the first are left out of points where they are NaN, so the
+    history points of an ensemble forecast carry no percentile bands.
+    """
+    dates = series.iso_dates()
+    (first, first_values), *others = series.columns.items()
+    records = [
+        {"date": date, first: value} for date, value in zip(dates, np.asarray(first_values, dtype=float).tolist())
+    ]
+    for name, values in others:
+        values = np.asarray(values, dtype=float)
+        for i in np.flatnonzero(np.isfinite(values)).tolist():
+            records[i][name] = float(values[i])
+    return records
+
+
+def columnar_payload(series: Series, date_encoding: str = "offsets", precision: int = DEFAULT_PRECISION) -> Dict[str, Any]:
+    """One object with the dates encoded once and every column as a rounded list."""
+    if date_encoding == "iso":
+        payload = {"dates": series.iso_dates()}
+    else:
+        base, unit, offsets = series.offsets()
+        payload = {"base": base, "unit": unit, "offsets": offsets.tolist()}
+    for name, values in series.columns.items():
+        payload[name] = rounded_values(values, precision)
+    return payload
+
+
+def pack_binary(series_by_key: Dict[str, Series], **header_fields) -> bytes:
+    """Pack several series into one buffer with the layout described at the top of this module."""
+    header = {"series": {}, **header_fields}
+    chunks = []
+    position = 0
+    for key, series in series_by_key.items():
+        base, unit, offsets = series.offsets()
+        # Offsets are days, or seconds within the at most two years of intraday history
+        chunk = [offsets.astype('<i4').tobytes()]
+        chunk += [np.asarray(values, dtype='<f4').tobytes() for values in series.columns.values()]
+        header["series"][key] = {
+            "base": base,
+            "unit": unit,
+            "length": len(offsets),
+            "columns": list(series.columns),
+            "offset": position,
+        }
+        chunks.extend(chunk)
+        position += sum(len(part) for part in chunk)
+
+    header_bytes = json.dumps(header).encode()
+    padding = b"\0" * (-(4 + len(header_bytes)) % 4)
+    return struct.pack('<I', len(header_bytes)) + header_bytes + padding + b"".join(chunks)
+
+
+def parse_layout_options(options: Dict[str, Any], layouts: Sequence[str] = PAYLOAD_LAYOUTS) -> Dict[str, Any]:
+    """
+    Validate the layout, date encoding and precision of a request.
+    Raises ValueError with a message for the client when an option is invalid.
+    """
+    layout = options.get('layout', 'records')
+    if layout not in layouts:
+        raise ValueError(f"layout must be one of: {', '.join(layouts)}")
+
+    date_encoding = options.get('dates', 'offsets')
+    if date_encoding not in DATE_ENCODINGS:
+        raise ValueError(f"dates must be one of: {', '.join(DATE_ENCODINGS)}")
+
+    try:
+        precision = int(options.get('precision', DEFAULT_PRECISION))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("precision must be an integer")
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError(f"precision must be between 0 and {MAX_PRECISION}")
+
+    return {"layout": layout, "date_encoding": date_encoding, "precision": precision}
+
+
+def series_payload(series: Series, layout: str = "records", date_encoding: str = "offsets",
+                   precision: int = DEFAULT_PRECISION):
+    """Lay a series out as records or columnar JSON (binary is packed per response with pack_binary)."""
+    if layout == "columnar":
+        return columnar_payload(series, date_encoding, precision)
+    return records_payload(series)
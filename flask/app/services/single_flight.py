@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one upstream call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and get the same result (or exception) instead of
+    calling upstream again. Nothing is cached: once the call returns, the next
+    caller for the key starts a new one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+# Shared by every upstream fetch, keyed by (source, key...)
+upstream_calls = SingleFlight()
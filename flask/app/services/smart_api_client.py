@@ -1,8 +1,7 @@
 import os
-from SmartApi import SmartConnect
-import pyotp
+import threading
+
 from dotenv import load_dotenv
-import pandas as pd
 
 load_dotenv()
 
@@ -11,19 +10,41 @@ client_id = os.getenv("CLIENT_ID")
 password = os.getenv("PASSWORD")
 totp_secret = os.getenv("TOTP_SECRET")
 
-smart_api = SmartConnect(api_key=api_key)
-totp = pyotp.TOTP(totp_secret).now()
-login_response = smart_api.generateSession(client_id, password, totp)
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_smart_api():
+    """
+    The logged-in SmartAPI client, logging in on first use rather than on import,
+    so the app starts (e.g. with the replay providers) without credentials or network.
+
+    Raises:
+        RuntimeError: if the login fails
+    """
+    global _session
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            from SmartApi import SmartConnect
+            import pyotp
+
+            client = SmartConnect(api_key=api_key)
+            totp = pyotp.TOTP(totp_secret).now()
+            login_response = client.generateSession(client_id, password, totp)
+            if not login_response['status']:
+                raise RuntimeError(f"SmartAPI Login Failed: {login_response['message']}")
+            print("SmartAPI Login Successful")
+            _session = client
+    return _session
+
+
+class _LazySmartApi:
+    """Stand-in for the client that logs in when one of its methods is first used."""
 
+    def __getattr__(self, name):
+        return getattr(get_smart_api(), name)
 
 
-if login_response['status']:
-    print("SmartAPI Login Successful")
-else:
-    print("SmartAPI Login Failed:", login_response['message'])
-    exit()
-# Fetch Holdings
-holdings = smart_api.holding()
-holdings_df = pd.DataFrame(holdings['data'])
-user_stocks = holdings_df['tradingsymbol'].tolist()
-print("Angel Broking symbols:", user_stocks)
+smart_api = _LazySmartApi()
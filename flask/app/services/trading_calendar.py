@@ -0,0 +1,133 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr, USPresidentsDay,
+    USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday
+)
+
+# Range covered by the precomputed trading day indexes
+CALENDAR_START = '1990-01-01'
+CALENDAR_END = '2080-12-31'
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+class NSEHolidayCalendar(AbstractHolidayCalendar):
+    # Holidays that follow a fixed rule every year; those falling on a weekend are not moved.
+    # They are also the whole calendar of years after the published lists below
+    rules = [
+        Holiday("Republic Day", month=1, day=26),
+        GoodFriday,
+        Holiday("Dr. Baba Saheb Ambedkar Jayanti", month=4, day=14),
+        Holiday("Maharashtra Day", month=5, day=1),
+        Holiday("Independence Day", month=8, day=15),
+        Holiday("Gandhi Jayanti", month=10, day=2),
+        Holiday("Christmas", month=12, day=25),
+    ]
+
+
+# Lunar-calendar and special holidays from the exchange's published circulars
+# (BSE follows the same list). The lists run through 2026: later years only get
+# the rule-based holidays above, until their circular is added here.
+NSE_PUBLISHED_HOLIDAYS = [
+    # 2024
+    '2024-01-22', '2024-03-08', '2024-03-25', '2024-03-29', '2024-04-11', '2024-04-17',
+    '2024-05-20', '2024-06-17', '2024-07-17', '2024-11-01', '2024-11-15', '2024-11-20',
+    # 2025
+    '2025-02-26', '2025-03-14', '2025-03-31', '2025-04-10', '2025-04-14', '2025-04-18',
+    '2025-08-27', '2025-10-21', '2025-10-22', '2025-11-05',
+    # 2026
+    '2026-03-03', '2026-03-26', '2026-03-31', '2026-05-28', '2026-06-26', '2026-09-14',
+    '2026-10-20', '2026-11-10', '2026-11-24',
+]
+
+HOLIDAY_CALENDARS = {
+    "NYSE": NYSEHolidayCalendar,
+    "NSE": NSEHolidayCalendar,
+    "BSE": NSEHolidayCalendar,
+}
+
+PUBLISHED_HOLIDAYS = {
+    "NYSE": [],
+    "NSE": NSE_PUBLISHED_HOLIDAYS,
+    "BSE": NSE_PUBLISHED_HOLIDAYS,
+}
+
+
+def exchange_for_symbol(symbol: str) -> str:
+    """Exchange a yfinance symbol trades on, from its suffix (US listings have none)."""
+    if symbol.endswith('.NS'):
+        return "NSE"
+    if symbol.endswith('.BO'):
+        return "BSE"
+    return "NYSE"
+
+
+@lru_cache(maxsize=None)
+def trading_days(exchange: str) -> np.ndarray:
+    """Sorted datetime64[D] array of every trading day of an exchange in the calendar range."""
+    holidays = HOLIDAY_CALENDARS[exchange]().holidays(CALENDAR_START, CALENDAR_END).values.astype('datetime64[D]')
+    holidays = np.concatenate([holidays, np.array(PUBLISHED_HOLIDAYS[exchange], dtype='datetime64[D]')])
+
+    calendar = np.busdaycalendar(weekmask='1111100', holidays=holidays)
+    days = np.arange(np.datetime64(CALENDAR_START), np.datetime64(CALENDAR_END) + 1, dtype='datetime64[D]')
+    days = days[np.is_busday(days, busdaycal=calendar)]
+    days.setflags(write=False)
+    return days
+
+
+def to_day(date) -> np.datetime64:
+    """Calendar day of a (possibly timezone-aware) timestamp in the exchange's local time."""
+    timestamp = pd.Timestamp(date)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_localize(None)
+    return np.datetime64(timestamp.date(), 'D')
+
+
+def future_trading_days(exchange: str, last_date, offsets) -> np.ndarray:
+    """
+    Trading days `offsets` sessions after `last_date`, by lookup into the calendar index.
+
+    Args:
+        exchange: Exchange name (NYSE, NSE or BSE)
+        last_date: Last observed bar date
+        offsets: Array of trading-day offsets, 1 being the next session
+
+    Returns:
+        datetime64[D] array of the same length as offsets
+    """
+    days = trading_days(exchange)
+    start = np.searchsorted(days, to_day(last_date), side='right') - 1
+    positions = start + np.asarray(offsets)
+    if len(positions) and positions[-1] >= len(days):
+        raise ValueError(f"Forecast horizon runs past the end of the {exchange} calendar ({CALENDAR_END})")
+    return days[positions]
+
+
+def day_array(dates) -> np.ndarray:
+    """Calendar days of a DatetimeIndex (in its local time) or datetime64 array as datetime64[D]."""
+    if isinstance(dates, pd.DatetimeIndex):
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        dates = dates.values
+    return np.asarray(dates).astype('datetime64[D]')
+
+
+def format_days(dates) -> np.ndarray:
+    """Format dates (a DatetimeIndex or datetime64 array) as YYYY-MM-DD strings in one vectorised call."""
+    return np.datetime_as_string(day_array(dates), unit='D')
@@ -0,0 +1,247 @@
+import os
+import logging
+from typing import Dict, List, Sequence
+
+import joblib
+import numpy as np
+import torch
+import torch.nn as nn
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import MinMaxScaler
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+
+from app.services.forecasting import BiLSTMModel
+
+
+class WindowDataset(Dataset):
+    """
+    (window, next value) training pairs over the scaled differences of many tickers.
+
+    `values` holds every ticker's scaled differences back to back as float32 and
+    every sample is a row of a zero-copy sliding view over it, so nothing is
+    materialised per window.
+    `starts` selects the windows to serve; it must not contain windows that
+    straddle two tickers (see window_starts). The dataset is indexed with whole
+    batches of sample indices, which are gathered with a single fancy index
+    instead of one __getitem__ call per sample.
+    """
+
+    def __init__(self, values: np.ndarray, seq_length: int, starts: np.ndarray):
+        self.values = values
+        self.seq_length = seq_length
+        self.starts = starts
+        # Row i is values[i:i + seq_length + 1]: the window followed by its target
+        self.rows = sliding_window_view(values, seq_length + 1)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, indices):
+        rows = torch.from_numpy(self.rows[self.starts[indices]])
+        return rows[:, :-1].unsqueeze(-1), rows[:, -1:]
+
+
+def window_starts(lengths: Sequence[int], seq_length: int, val_fraction: float = 0.0):
+    """
+    Start positions of the training and validation windows in the concatenated series.
+
+    Only windows that stay within one ticker are used. The last `val_fraction` of
+    each ticker's windows are held out, so validation windows always come after
+    the training windows of the same ticker.
+    """
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    train, val = [], []
+    for offset, length in zip(offsets, lengths):
+        starts = offset + np.arange(max(0, length - seq_length), dtype=np.int64)
+        cut = int(len(starts) * (1 - val_fraction))
+        train.append(starts[:cut])
+        val.append(starts[cut:])
+    return np.concatenate(train), np.concatenate(val)
+
+
+def fit_diff_scaler(closes: Sequence[np.ndarray], train_fraction: float) -> MinMaxScaler:
+    """Fit the (-1, 1) MinMax scaler on the training part of every ticker's differences."""
+    diffs = np.concatenate([np.diff(c)[:max(1, int((len(c) - 1) * train_fraction))] for c in closes])
+    return MinMaxScaler(feature_range=(-1, 1)).fit(diffs.reshape(-1, 1))
+
+
+def batch_loader(dataset: WindowDataset, batch_size: int, shuffle: bool, num_workers: int, seed: int) -> DataLoader:
+    """DataLoader handing whole batches of indices to the dataset."""
+    if shuffle:
+        sampler = RandomSampler(dataset, generator=torch.Generator().manual_seed(seed))
+    else:
+        sampler = SequentialSampler(dataset)
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size, drop_last=False),
+        batch_size=None,
+        num_workers=num_workers,
+        pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+    )
+
+
+def save_checkpoint(path: str, state: Dict):
+    """Write a training checkpoint atomically."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def train_bilstm(
+    closes: Sequence[np.ndarray],
+    output_dir: str,
+    model_name: str = "bilstm_stock_model",
+    seq_length: int = 30,
+    epochs: int = 50,
+    batch_size: int = 64,
+    learning_rate: float = 0.001,
+    val_fraction: float = 0.2,
+    patience: int = 10,
+    num_workers: int = 0,
+    seed: int = 42,
+    resume: bool = False,
+    progress=None
+) -> Dict:
+    """
+    Train a BiLSTMModel on the daily closes of one or more tickers.
+
+    Writes the three files the model registry loads into `output_dir`:
+    `<model_name>.pth` (the best state dict), `scaler_diff.pkl` and
+    `model_metadata.pkl`. A checkpoint with the model, optimizer and scheduler
+    state is saved after every epoch, and `resume=True` continues from it.
+
+    Args:
+        closes: Daily closes of every ticker, oldest first
+        output_dir: Directory for the artifacts and the checkpoint
+        model_name: File name of the checkpoint, without extension
+        seq_length: Input window length
+        epochs: Maximum number of epochs
+        batch_size: Windows per batch
+        learning_rate: Adam learning rate
+        val_fraction: Fraction of every ticker's windows held out for validation
+        patience: Epochs without improvement before stopping early
+        num_workers: DataLoader worker processes
+        seed: Seed for the weights and the batch order
+        resume: Continue from the checkpoint in output_dir if there is one
+        progress: Optional callback called as progress(epoch, train_loss, val_loss)
+
+    Returns:
+        Dictionary with the paths of the artifacts and the loss history
+    """
+    torch.manual_seed(seed)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    closes = [np.asarray(c, dtype=float).ravel() for c in closes if len(c) > seq_length + 1]
+    if not closes:
+        raise ValueError(f"Every series is shorter than the sequence length ({seq_length})")
+
+    # The scaler only sees the training part of every series, like the model
+    scaler_diff = fit_diff_scaler(closes, 1 - val_fraction)
+    values = np.concatenate([
+        scaler_diff.transform(np.diff(c).reshape(-1, 1))[:, 0] for c in closes
+    ]).astype(np.float32)
+
+    train_starts, val_starts = window_starts([len(c) - 1 for c in closes], seq_length, val_fraction)
+    train_loader = batch_loader(WindowDataset(values, seq_length, train_starts), batch_size, True, num_workers, seed)
+    val_loader = batch_loader(WindowDataset(values, seq_length, val_starts), batch_size, False, num_workers, seed)
+
+    model = BiLSTMModel().to(device)
+    criterion = nn.MSELoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=max(1, patience // 2))
+
+    checkpoint_path = os.path.join(output_dir, f"{model_name}.checkpoint.pt")
+    start_epoch = 0
+    best_val_loss = float('inf')
+    best_state = None
+    history: Dict[str, List[float]] = {"train_loss": [], "val_loss": []}
+    stale_epochs = 0
+
+    if resume and os.path.exists(checkpoint_path):
+        checkpoint = torch.load(checkpoint_path, map_location=device, weights_only=False)
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        scheduler.load_state_dict(checkpoint["scheduler"])
+        start_epoch = checkpoint["epoch"] + 1
+        best_val_loss = checkpoint["best_val_loss"]
+        best_state = checkpoint["best_model"]
+        history = checkpoint["history"]
+        stale_epochs = checkpoint["stale_epochs"]
+        torch.set_rng_state(checkpoint["rng_state"])
+        logging.info(f"Resuming {model_name} from epoch {start_epoch}")
+
+    for epoch in range(start_epoch, epochs):
+        if stale_epochs >= patience:
+            break
+
+        # Reshuffle with a per-epoch seed so a resumed run sees the same batches
+        train_loader.sampler.sampler.generator.manual_seed(seed + epoch)
+
+        model.train()
+        train_loss = 0.0
+        for X_batch, y_batch in train_loader:
+            X_batch, y_batch = X_batch.to(device, non_blocking=True), y_batch.to(device, non_blocking=True)
+            loss = criterion(model(X_batch), y_batch)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item()
+        train_loss /= max(1, len(train_loader))
+
+        model.eval()
+        val_loss = 0.0
+        with torch.no_grad():
+            for X_batch, y_batch in val_loader:
+                X_batch, y_batch = X_batch.to(device, non_blocking=True), y_batch.to(device, non_blocking=True)
+                val_loss += criterion(model(X_batch), y_batch).item()
+        val_loss = val_loss / len(val_loader) if len(val_loader) else train_loss
+
+        scheduler.step(val_loss)
+        history["train_loss"].append(train_loss)
+        history["val_loss"].append(val_loss)
+
+        if val_loss < best_val_loss:
+            best_val_loss = val_loss
+            best_state = {key: value.detach().cpu().clone() for key, value in model.state_dict().items()}
+            stale_epochs = 0
+        else:
+            stale_epochs += 1
+
+        save_checkpoint(checkpoint_path, {
+            "epoch": epoch,
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scheduler": scheduler.state_dict(),
+            "best_val_loss": best_val_loss,
+            "best_model": best_state,
+            "history": history,
+            "stale_epochs": stale_epochs,
+            "rng_state": torch.get_rng_state(),
+        })
+
+        if progress is not None:
+            progress(epoch, train_loss, val_loss)
+
+    if best_state is None:
+        raise ValueError("Training finished without a single completed epoch")
+
+    # The artifact trio the model registry loads
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        "model": os.path.join(output_dir, f"{model_name}.pth"),
+        "scaler": os.path.join(output_dir, "scaler_diff.pkl"),
+        "metadata": os.path.join(output_dir, "model_metadata.pkl"),
+    }
+    torch.save(best_state, paths["model"])
+    joblib.dump(scaler_diff, paths["scaler"])
+    joblib.dump({
+        "seq_length": seq_length,
+        "first_price": float(closes[0][0]),
+        "best_val_loss": best_val_loss,
+        "epochs_trained": len(history["val_loss"]),
+        "series": len(closes),
+    }, paths["metadata"])
+
+    return {"paths": paths, "best_val_loss": best_val_loss, "history": history}
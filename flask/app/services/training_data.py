@@ -0,0 +1,26 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+def load_csv_closes(path: str) -> np.ndarray:
+    """Daily closes of a CSV file with Date and Close columns, oldest first."""
+    df = pd.read_csv(path)
+    df['Date'] = pd.to_datetime(df['Date'], utc=True)
+    return df.sort_values('Date')['Close'].dropna().values.astype(float)
+
+
+def download_closes(tickers: List[str]) -> Dict[str, np.ndarray]:
+    """Daily closes of all tickers in one multi-symbol download."""
+    import yfinance as yf
+
+    data = yf.download(tickers, period="max", interval='1d', group_by='ticker', threads=True, progress=False)
+    history = {}
+    for symbol in tickers:
+        if symbol not in data.columns.get_level_values(0):
+            continue
+        closes = data[symbol]['Close'].dropna().values.astype(float)
+        if len(closes):
+            history[symbol] = closes
+    return history
@@ -0,0 +1,258 @@
+"""
+Scheduling of calls to upstream market data and broker APIs.
+
+Every call names the upstream host it goes to ("smartapi", "yahoo", "replay").
+Per host there is:
+
+- a token bucket limiting the call rate, which callers queue on for at most
+  `max_wait` seconds (hosts without configured limits aren't throttled);
+- retries of failed calls with jittered exponential backoff;
+- a circuit breaker that opens after `failure_threshold` failures in a row.
+  While it is open, calls fail immediately instead of piling onto an upstream
+  that is down. After `reset_timeout` seconds a single trial call is let
+  through, and its outcome closes the breaker or opens it again. Errors about
+  the request itself (e.g. an unknown symbol) show the host is answering, so
+  they are raised as they are without retries and don't count as failures.
+
+call_with_snapshot() also keeps the last good result per key. When the host
+can't be reached it returns that snapshot, flagged as stale, rather than
+failing the request.
+"""
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app import config
+
+
+class UpstreamError(Exception):
+    """An upstream call failed, or wasn't attempted because its host is unavailable."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The host's circuit breaker is open."""
+
+
+class TokenBucket:
+    """`rate` calls per second on average, with bursts of up to `burst` calls."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: float) -> bool:
+        """Take a token, waiting up to `max_wait` seconds for one. Returns False when none came in time."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if wait > max_wait:
+                return False
+            # Reserve the token now; callers queued behind wait correspondingly longer
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    """Closed, open or half-open state of one host, from the outcomes of its calls."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now. In half-open state only one trial call is let through."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def cancel(self):
+        """Give back a call allow() let through that never reached the host."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> bool:
+        """Count a failure. Returns True if the breaker is (now) open."""
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+            return self._opened_at is not None
+
+
+class Snapshot:
+    """Result of an upstream call, or the last good one when `stale` is set."""
+
+    def __init__(self, value: Any, fetched_at: float, stale: bool = False):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.stale = stale
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class UpstreamScheduler:
+    """Rate limits, retries and circuit breakers per upstream host (see the module docstring)."""
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        retries: int,
+        backoff_base: float,
+        backoff_cap: float,
+        failure_threshold: int,
+        reset_timeout: float,
+        max_wait: float
+    ):
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_wait = max_wait
+        self.buckets = {host: TokenBucket(rate, burst) for host, (rate, burst) in limits.items()}
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {host: CircuitBreaker(failure_threshold, reset_timeout) for host in limits}
+        self._snapshots: Dict[Tuple[str, Hashable], Snapshot] = {}
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before retry `attempt` (0-based): full jitter over an exponential cap."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def call(
+        self, host: str, fn: Callable[..., Any], *args, is_failure: Callable[[Any], bool] = None,
+        is_request_error: Callable[[BaseException], bool] = None, **kwargs
+    ) -> Any:
+        """
+        Call `fn(*args, **kwargs)` on `host`, retrying failures.
+
+        Args:
+            host: Upstream host the call goes to; hosts missing from the configured limits aren't throttled
+            fn: The call itself
+            is_failure: Optional check flagging results that report an error
+                instead of raising one (e.g. SmartAPI's {"status": False})
+            is_request_error: Optional check flagging errors about the request
+                rather than the host (e.g. an unknown symbol), which are raised
+                without retrying or counting against the host's breaker
+
+        Returns:
+            The call's result
+
+        Raises:
+            CircuitOpenError: if the host's breaker is open
+            UpstreamError: if the call kept failing, or no rate-limit token came in time
+            Exception: whatever the call raised, when is_request_error flags it
+        """
+        bucket = self.buckets.get(host)
+        with self._lock:
+            breaker = self.breakers.setdefault(host, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} is unavailable (circuit open)") from last_error
+            if bucket is not None and not bucket.acquire(self.max_wait):
+                # The call never reached the host, so it doesn't tell the breaker anything
+                breaker.cancel()
+                raise UpstreamError(f"{host} rate limit: no slot within {self.max_wait:.0f}s")
+
+            try:
+                result = fn(*args, **kwargs)
+                if is_failure is not None and is_failure(result):
+                    raise UpstreamError(f"{host} reported a failure: {str(result)[:200]}")
+            except Exception as e:
+                if is_request_error is not None and is_request_error(e):
+                    breaker.record_success()
+                    raise
+                last_error = e
+                opened = breaker.record_failure()
+                logging.warning(f"{host} call failed (attempt {attempt + 1}/{self.retries + 1}): {e}")
+                if opened or attempt == self.retries:
+                    break
+                time.sleep(self.backoff(attempt))
+            else:
+                breaker.record_success()
+                return result
+
+        if isinstance(last_error, UpstreamError):
+            raise last_error
+        raise UpstreamError(f"{host} call failed: {last_error}") from last_error
+
+    def call_with_snapshot(
+        self, host: str, key: Hashable, fn: Callable[..., Any], *args,
+        is_failure: Callable[[Any], bool] = None, is_request_error: Callable[[BaseException], bool] = None, **kwargs
+    ) -> Snapshot:
+        """
+        Like call(), keeping the last good result per (host, key). When the call
+        fails or the breaker is open, that result is returned with `stale` set;
+        without one, the error is raised.
+        """
+        try:
+            value = self.call(host, fn, *args, is_failure=is_failure, is_request_error=is_request_error, **kwargs)
+        except UpstreamError as e:
+            with self._lock:
+                snapshot = self._snapshots.get((host, key))
+            if snapshot is None:
+                raise
+            logging.warning(f"Serving {host} {key} from {snapshot.age:.0f}s ago: {e}")
+            return Snapshot(snapshot.value, snapshot.fetched_at, stale=True)
+
+        snapshot = Snapshot(value, time.time())
+        with self._lock:
+            self._snapshots[(host, key)] = snapshot
+        return snapshot
+
+
+def stale_headers(*snapshots: Snapshot) -> Dict[str, str]:
+    """Response headers flagging data served from a stale snapshot, with its age in seconds."""
+    stale = [snapshot for snapshot in snapshots if snapshot.stale]
+    if not stale:
+        return {}
+    return {"X-Data-Stale": "true", "X-Data-Age": str(int(max(snapshot.age for snapshot in stale)))}
+
+
+upstream = UpstreamScheduler(
+    limits={
+        "smartapi": (config.SMARTAPI_RATE_LIMIT, config.SMARTAPI_BURST),
+        "yahoo": (config.YAHOO_RATE_LIMIT, config.YAHOO_BURST),
+    },
+    retries=config.UPSTREAM_RETRIES,
+    backoff_base=config.UPSTREAM_BACKOFF_BASE,
+    backoff_cap=config.UPSTREAM_BACKOFF_CAP,
+    failure_threshold=config.UPSTREAM_FAILURE_THRESHOLD,
+    reset_timeout=config.UPSTREAM_RESET_TIMEOUT,
+    max_wait=config.UPSTREAM_MAX_WAIT,
+)
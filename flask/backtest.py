@@ -0,0 +1,84 @@
+"""
+Walk-forward backtest of the forecasting models against ARIMA/SARIMA baselines.
+
+Forecasts are made from rolling origins over each ticker's daily history and
+scored against the bars that followed, for several horizons. Folds run on a
+process pool, so comparing checkpoints takes minutes on a multi-core machine.
+Price history comes from CSV files with Date and Close columns, or from
+yfinance for --tickers.
+
+Usage:
+    python backtest.py --csv AAPL_data.csv --horizons 5 21 63 --workers 8
+    python backtest.py --tickers AAPL MSFT RELIANCE.NS --versions bilstm_stock_model bilstm_stock_model_new
+    python backtest.py --tickers AAPL --baselines --ensemble 64 --output backtest_results.json
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from app import config
+from app.services.backtesting import BASELINE_MODELS, walk_forward_backtest
+from app.services.model_export import INFERENCE_BACKENDS
+from app.services.training_data import download_closes, load_csv_closes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', nargs='*', default=[], help="tickers to download from yfinance")
+    parser.add_argument('--csv', nargs='*', default=[], help="CSV files with Date and Close columns")
+    parser.add_argument('--versions', nargs='+', default=[config.DEFAULT_MODEL_VERSION], choices=list(config.MODEL_VERSIONS))
+    parser.add_argument('--backend', default="eager", choices=INFERENCE_BACKENDS)
+    parser.add_argument('--horizons', type=int, nargs='+', default=[5, 21, 63], help="horizons in trading days")
+    parser.add_argument('--step', type=int, default=21, help="bars between consecutive origins")
+    parser.add_argument('--min-train', type=int, default=252, help="bars of history before the first origin")
+    parser.add_argument('--max-origins', type=int, default=None, help="keep only the most recent origins per ticker")
+    parser.add_argument('--baselines', nargs='*', default=list(BASELINE_MODELS), choices=BASELINE_MODELS,
+                        help="baselines to compare against (pass the flag alone to skip them)")
+    parser.add_argument('--fit-window', type=int, default=750, help="bars the baselines are fit on (0 for all)")
+    parser.add_argument('--ensemble', type=int, default=1, help="paths behind the median BiLSTM forecast")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=8, help="origins per task")
+    parser.add_argument('--output', default="backtest_results.json")
+    args = parser.parse_args()
+
+    started = time.time()
+
+    history = {os.path.splitext(os.path.basename(path))[0]: load_csv_closes(path) for path in args.csv}
+    if args.tickers:
+        history.update(download_closes(list(dict.fromkeys(args.tickers))))
+    if not history:
+        parser.error("no price history: pass --tickers and/or --csv")
+    print(f"Backtesting {len(history)} tickers with {', '.join(args.versions)} against {', '.join(args.baselines) or 'no baselines'}")
+
+    def progress(done, total):
+        print(f"\r{done}/{total} chunks ({time.time() - started:.0f}s)", end="", flush=True)
+
+    summary = walk_forward_backtest(
+        history, args.versions,
+        horizons=args.horizons, step=args.step, min_train=args.min_train, max_origins=args.max_origins,
+        baselines=args.baselines, n_paths=args.ensemble, seed=args.seed, fit_window=args.fit_window or None,
+        workers=args.workers, chunk_size=args.chunk_size, backend=args.backend, progress=progress
+    )
+    print()
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "seconds": round(time.time() - started, 1),
+        **summary,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for model, horizons in summary["models"].items():
+        print(f"{model:>24}  " + "  ".join(
+            f"h={horizon}: MAPE {values['mape']:.2f}% RMSE {values['rmse']:.2f}" for horizon, values in horizons.items()
+        ))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
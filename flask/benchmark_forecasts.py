@@ -0,0 +1,248 @@
+"""
+Benchmark the speed and accuracy of the forecasting models, fully offline.
+
+For every shipped checkpoint this measures:
+- per-step latency of the forecast kernel
+- ticker throughput for several batch sizes
+- peak memory of a forecast (process RSS, measured in a fresh interpreter per model)
+- MAPE / RMSE of the median forecast against held-out bars of the bundled
+  AAPL CSVs and of synthetic GBM series
+
+Results are written as JSON. Pass --compare with an earlier results file to
+print the relative change of every metric.
+
+Usage:
+    python benchmark_forecasts.py --output benchmark_results.json
+    python benchmark_forecasts.py --backend int8 --compare benchmark_results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import torch
+
+from app import config
+from app.services.forecasting import ForecastKernel
+from app.services.model_export import INFERENCE_BACKENDS
+from app.services.model_registry import ModelRegistry
+
+# Bundled price files used as held-out data
+CSV_FILES = ["AAPL_data.csv", "AAPL_2024-01-01_to_2024-03-01.csv"]
+
+
+def load_csv_closes(path):
+    df = pd.read_csv(path)
+    df['Date'] = pd.to_datetime(df['Date'], utc=True)
+    return df.sort_values('Date')['Close'].values.astype(float)
+
+
+def synthetic_closes(seed, length=750, start=100.0, mu=0.0003, sigma=0.018):
+    """Daily closes following a geometric Brownian motion."""
+    rng = np.random.default_rng(seed)
+    returns = (mu - 0.5 * sigma**2) + sigma * rng.standard_normal(length - 1)
+    return start * np.exp(np.concatenate([[0.0], np.cumsum(returns)]))
+
+
+def prepare_window(closes, seq_length, scaler_diff):
+    """Scaled differences of the last seq_length bars, zero-padded for short series."""
+    diffs = np.diff(closes).reshape(-1, 1)
+    if len(diffs) < seq_length:
+        diffs = np.vstack([np.zeros((seq_length - len(diffs), 1)), diffs])
+    return scaler_diff.transform(diffs[-seq_length:])
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """Resident set size right now, from /proc or psutil when installed; None where neither is available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def time_run(kernel, windows, prices, steps, repeats):
+    """Best wall time of `repeats` forecasts of `steps` steps."""
+    best = float('inf')
+    for repeat in range(repeats):
+        generator = torch.Generator().manual_seed(repeat)
+        started = time.perf_counter()
+        kernel.run(windows, steps, prices, generator)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark_speed(bundle, steps, batch_sizes, repeats):
+    kernel = ForecastKernel(bundle.model, bundle.scaler_diff)
+    rng = np.random.default_rng(0)
+
+    # Warm up so one-off initialisation doesn't count towards the first measurement
+    warmup = torch.tensor(rng.uniform(0, 1, size=(1, bundle.seq_length, 1)), dtype=torch.float32)
+    kernel.run(warmup, 10, np.array([100.0]))
+
+    throughput = []
+    for batch_size in batch_sizes:
+        windows = torch.tensor(rng.uniform(0, 1, size=(batch_size, bundle.seq_length, 1)), dtype=torch.float32)
+        prices = rng.uniform(50, 500, size=batch_size)
+        seconds = time_run(kernel, windows, prices, steps, repeats)
+        throughput.append({
+            "batch_size": batch_size,
+            "seconds": seconds,
+            "step_latency_ms": seconds / steps * 1000,
+            "tickers_per_second": batch_size / seconds,
+        })
+
+    return {
+        "steps": steps,
+        "step_latency_ms": throughput[0]["step_latency_ms"],
+        "throughput": throughput,
+    }
+
+
+def benchmark_memory(version, backend, steps, batch_size, threads):
+    """
+    Peak RSS of one forecast. Meant to run in a fresh interpreter (see main), as
+    ru_maxrss is a process-wide high-water mark that earlier runs would have set.
+
+    peak_rss_growth_mb is the peak over the RSS right before the run, with the
+    model loaded. Loading may itself have peaked higher, so it is an upper bound.
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    registry = ModelRegistry(config.MODEL_VERSIONS, config.MODEL_DIR, config.DEFAULT_MODEL_VERSION, backend=backend)
+    bundle = registry.get(version)
+    kernel = ForecastKernel(bundle.model, bundle.scaler_diff)
+    windows = torch.rand((batch_size, bundle.seq_length, 1), generator=torch.Generator().manual_seed(0))
+    prices = np.full(batch_size, 100.0)
+
+    rss_before = current_rss_mb()
+    kernel.run(windows, steps, prices)
+    peak = peak_rss_mb()
+
+    return {
+        "batch_size": batch_size,
+        "steps": steps,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak,
+        "peak_rss_growth_mb": max(0.0, peak - rss_before) if rss_before is not None else None,
+    }
+
+
+def benchmark_accuracy(bundle, series, holdout, n_paths, seed):
+    kernel = ForecastKernel(bundle.model, bundle.scaler_diff)
+    results = {}
+    for name, closes in series.items():
+        train, actual = closes[:-holdout], closes[-holdout:]
+        window = torch.tensor(prepare_window(train, bundle.seq_length, bundle.scaler_diff), dtype=torch.float32)
+
+        # Score the ensemble median, which is less arbitrary than a single sample path
+        generator = torch.Generator().manual_seed(seed)
+        forecast = kernel.run(
+            window.unsqueeze(0), holdout, np.array([train[-1]]), generator, n_paths=n_paths, quantiles=(50,)
+        )[0, 0]
+
+        errors = forecast - actual
+        results[name] = {
+            "holdout": holdout,
+            "mape": float(np.mean(np.abs(errors / actual)) * 100),
+            "rmse": float(np.sqrt(np.mean(errors**2))),
+        }
+    return results
+
+
+def compare_results(previous, current, path=""):
+    """Print the relative change of every numeric metric found in both result trees."""
+    if isinstance(previous, dict) and isinstance(current, dict):
+        for key in current:
+            if key in previous:
+                compare_results(previous[key], current[key], f"{path}.{key}" if path else str(key))
+    elif isinstance(previous, list) and isinstance(current, list):
+        for index, (before, after) in enumerate(zip(previous, current)):
+            compare_results(before, after, f"{path}[{index}]")
+    elif isinstance(previous, (int, float)) and isinstance(current, (int, float)) and not isinstance(current, bool):
+        if previous and previous != current:
+            print(f"{path}: {previous:.6g} -> {current:.6g} ({(current - previous) / abs(previous):+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--versions', nargs='+', default=list(config.MODEL_VERSIONS), choices=list(config.MODEL_VERSIONS))
+    parser.add_argument('--backend', default="eager", choices=INFERENCE_BACKENDS)
+    parser.add_argument('--steps', type=int, default=252, help="forecast steps timed per run")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--holdout', type=int, default=10, help="bars held out for the accuracy metrics")
+    parser.add_argument('--ensemble', type=int, default=64, help="paths behind the median forecast")
+    parser.add_argument('--synthetic', type=int, default=5, help="number of synthetic GBM series")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--threads', type=int, default=None, help="torch intra-op threads")
+    parser.add_argument('--output', default="benchmark_results.json")
+    parser.add_argument('--compare', default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # Read the baseline up front in case it is about to be overwritten
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    series = {name: load_csv_closes(os.path.join(config.BASE_DIR, name)) for name in CSV_FILES}
+    for index in range(args.synthetic):
+        series[f"synthetic_gbm_{index}"] = synthetic_closes(args.seed + index)
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "backend": args.backend,
+        "torch_version": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "platform": platform.platform(),
+        "models": {},
+    }
+
+    registry = ModelRegistry(config.MODEL_VERSIONS, config.MODEL_DIR, config.DEFAULT_MODEL_VERSION, backend=args.backend)
+    for version in args.versions:
+        bundle = registry.get(version)
+        print(f"Benchmarking {version} ({bundle.backend})")
+        # A fresh interpreter per model, so neither this process's runs nor earlier models set its peak RSS
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            memory = executor.submit(
+                benchmark_memory, version, args.backend, args.steps, max(args.batch_sizes), args.threads
+            ).result()
+        results["models"][version] = {
+            "backend": bundle.backend,
+            "memory": memory,
+            "speed": benchmark_speed(bundle, args.steps, args.batch_sizes, args.repeats),
+            "accuracy": benchmark_accuracy(bundle, series, args.holdout, args.ensemble, args.seed),
+        }
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if previous is not None:
+        compare_results(previous, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Export a model version to TorchScript and int8-quantized TorchScript.
+
+The exported files are written next to the checkpoint (e.g.
+bilstm_stock_model_new.torchscript.pt and bilstm_stock_model_new.int8.pt) and are
+picked up by the model registry when INFERENCE_BACKEND selects that backend.
+
+Usage:
+    python export_model.py --version bilstm_stock_model_new --steps 252
+"""
+import argparse
+import json
+import os
+import sys
+
+import torch
+
+from app import config
+from app.services.model_export import (
+    INFERENCE_BACKENDS, build_backend, compare_forecasts, export_path
+)
+from app.services.model_registry import ModelRegistry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--version', default=config.DEFAULT_MODEL_VERSION, choices=list(config.MODEL_VERSIONS))
+    parser.add_argument('--backends', nargs='+', default=["torchscript", "int8"],
+                        choices=[backend for backend in INFERENCE_BACKENDS if backend != "eager"])
+    parser.add_argument('--steps', type=int, default=252, help="forecast steps used for the tolerance check")
+    parser.add_argument('--tolerance', type=float, default=config.INFERENCE_TOLERANCE)
+    args = parser.parse_args()
+
+    # Always load the fp32 eager model as the reference
+    registry = ModelRegistry(config.MODEL_VERSIONS, config.MODEL_DIR, args.version, backend="eager")
+    bundle = registry.get(args.version)
+    model_path = os.path.join(config.MODEL_DIR, config.MODEL_VERSIONS[args.version]['model'])
+
+    failed = False
+    for backend in args.backends:
+        # Build from the checkpoint, not from a previous export
+        exported = build_backend(bundle.model, backend)
+        report = compare_forecasts(bundle.model, exported, bundle.scaler_diff, bundle.seq_length, args.steps)
+        report["within_tolerance"] = report["max_path_rel_diff"] <= args.tolerance
+
+        if report["within_tolerance"]:
+            path = export_path(model_path, backend)
+            torch.jit.save(exported, path)
+            report["path"] = path
+        else:
+            failed = True
+
+        print(json.dumps({"version": args.version, "backend": backend, **report}))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
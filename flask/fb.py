@@ -1,41 +1,22 @@
 import pandas as pd
 import yfinance as yf
-from SmartApi import SmartConnect
-import pyotp
 from flask import Flask, request, jsonify
-app = Flask(__name__)
-# User Credentials
-API_KEY = 'jAAvUq0N'
-CLIENT_ID = 'D53720220'
-PASSWORD = '8853'
-TOTP_SECRET = 'JPM46SLIQRRQMUB6CE2NLFD6YQ'
-
-# Initialize SmartConnect
-smart_api = SmartConnect(api_key=API_KEY)
 
-# Generate TOTP
-totp = pyotp.TOTP(TOTP_SECRET).now()
+# Holdings and orders go through the broker providers, which log in to SmartAPI
+# on first use (or serve the replay account with BROKER_PROVIDER=replay)
+from app.routes.stock_routes import fetch_holdings
+from app.services.providers import order_provider
+from app.services.upstream import stale_headers
 
-# Login
-login_response = smart_api.generateSession(CLIENT_ID, PASSWORD, totp)
-if login_response['status']:
-    print("Login Successful")
-else:
-    print("Login Failed:", login_response['message'])
-    exit()
-
-# Fetch Holdings
-holdings = smart_api.holding()
-holdings_df = pd.DataFrame(holdings['data'])
-user_stocks = holdings_df['tradingsymbol'].tolist()
-print(user_stocks)
+app = Flask(__name__)
 
 
 @app.route('/api/angelone/holdings', methods=['GET'])
 def get_angelone_holdings():
     try:
-        holdings = smart_api.holding()
-        return jsonify(holdings.get('data', []))  # Ensure array format
+        # Shares the breaker, rate limit and last good snapshot with /stocks
+        holdings = fetch_holdings()
+        return jsonify(holdings.value.get('data') or []), 200, stale_headers(holdings)  # Ensure array format
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -101,7 +82,7 @@ def place_order():
         'quantity': data['quantity']
     }
     try:
-        order_id = client.placeOrder(order_params)
+        order_id = order_provider.place_order(order_params)
         return jsonify({'status': 'success', 'order_id': order_id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -124,7 +105,7 @@ def modify_order():
         'quantity': data['quantity']
     }
     try:
-        response = client.modifyOrder(order_params)
+        response = order_provider.modify_order(order_params)
         return jsonify({'status': 'success', 'response': response})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -136,7 +117,7 @@ def cancel_order():
     order_id = data['orderid']
     variety = data['variety']
     try:
-        response = client.cancelOrder(order_id, variety)
+        response = order_provider.cancel_order(order_id, variety)
         return jsonify({'status': 'success', 'response': response})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -144,8 +125,5 @@ def cancel_order():
 #the backend code for them they automatically get displayed in frontend 
     
 
-# Logout
-logout_response = smart_api.terminateSession(CLIENT_ID)
-print("Logout Response:", logout_response)
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -1,16 +1,8 @@
 
 from flask import Flask, request, jsonify
-from SmartApi import SmartConnect
 
-import os
-
-
-
-
-api_key = os.getenv("SMART_API_KEY")
-
-
-client = SmartConnect(api_key)
+# Live SmartAPI orders, or the in-memory replay order book with BROKER_PROVIDER=replay
+from app.services.providers import order_provider
 
 
 # Endpoint to place an order
@@ -32,7 +24,7 @@ def place_order():
         'quantity': data['quantity']
     }
     try:
-        order_id = client.placeOrder(order_params)
+        order_id = order_provider.place_order(order_params)
         return jsonify({'status': 'success', 'order_id': order_id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -55,7 +47,7 @@ def modify_order():
         'quantity': data['quantity']
     }
     try:
-        response = client.modifyOrder(order_params)
+        response = order_provider.modify_order(order_params)
         return jsonify({'status': 'success', 'response': response})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -67,7 +59,7 @@ def cancel_order():
     order_id = data['orderid']
     variety = data['variety']
     try:
-        response = client.cancelOrder(order_id, variety)
+        response = order_provider.cancel_order(order_id, variety)
         return jsonify({'status': 'success', 'response': response})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
\ No newline at end of file
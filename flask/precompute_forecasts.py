@@ -0,0 +1,120 @@
+"""
+Precompute forecasts for every watched and held ticker into the forecast store.
+
+Meant to run nightly (e.g. from cron after the market closes) so the first
+dashboard load of the day is served from the forecast store. Tickers come from
+every team's watchlist in MongoDB and from the current SmartAPI holdings.
+
+Usage:
+    python precompute_forecasts.py --workers 4
+    python precompute_forecasts.py --skip-holdings --resolution multi
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+from pymongo import MongoClient
+
+from app import config
+from app.services.finance_utils import convert_to_yfinance_symbol
+from app.services.forecasting import predict_stock_prices, DEFAULT_HORIZON
+from app.services.model_registry import model_registry
+from app.services.ohlcv_store import ohlcv_store
+from app.services.providers import broker_provider
+
+
+def watchlist_tickers():
+    """Every distinct symbol in the teams' watchlists."""
+    client = MongoClient(os.getenv("MONGO_URI"))
+    teams_collection = client["hackfest2k25"]["teams"]
+    return [symbol for symbol in teams_collection.distinct('watchlist') if symbol]
+
+
+def holding_tickers():
+    """yfinance symbols of the current broker holdings."""
+    holdings_response = broker_provider.holding()
+    if not holdings_response['status']:
+        raise RuntimeError(f"Error fetching holdings: {holdings_response['message']}")
+    return [convert_to_yfinance_symbol(holding['tradingsymbol']) for holding in holdings_response['data'] or []]
+
+
+def init_worker(threads):
+    # Keep worker processes from oversubscribing the CPU cores between them
+    torch.set_num_threads(threads)
+
+
+def forecast_chunk(tickers, model_version, horizon, resolutions, n_paths):
+    """
+    Forecast one chunk of tickers for every resolution; results land in the forecast store.
+    Prices are read from the OHLCV store, like the live endpoints do.
+    """
+    bundle = model_registry.get(model_version)
+    errors = {}
+    for resolution in resolutions:
+        result = predict_stock_prices(
+            tickers, bundle, n_paths=n_paths, horizon=horizon, resolution=resolution
+        )
+        for symbol, series in result.items():
+            if isinstance(series, dict) and "error" in series:
+                errors[symbol] = series["error"]
+    return tickers, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', nargs='*', default=[], help="extra tickers to precompute")
+    parser.add_argument('--skip-watchlists', action='store_true')
+    parser.add_argument('--skip-holdings', action='store_true')
+    parser.add_argument('--model-version', default=config.DEFAULT_MODEL_VERSION, choices=list(config.MODEL_VERSIONS))
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON)
+    parser.add_argument('--resolution', nargs='+', default=["daily", "multi"],
+                        help="resolution presets to precompute (the dashboard chart uses multi)")
+    parser.add_argument('--ensemble', type=int, default=1, help="Monte Carlo paths per ticker")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=32, help="tickers forecast together in one batch")
+    args = parser.parse_args()
+
+    started = time.time()
+
+    tickers = list(args.tickers)
+    if not args.skip_watchlists:
+        tickers += watchlist_tickers()
+    if not args.skip_holdings:
+        tickers += holding_tickers()
+    tickers = list(dict.fromkeys(tickers))
+    print(f"Precomputing forecasts for {len(tickers)} tickers")
+    if not tickers:
+        return
+
+    # Only the bars since each ticker's last refresh are downloaded, in bulk
+    ohlcv_store.refresh_many(tickers)
+    print(f"Refreshed price history of {len(tickers)} tickers in {time.time() - started:.1f}s")
+
+    chunks = [tickers[i:i + args.chunk_size] for i in range(0, len(tickers), args.chunk_size)]
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+
+    errors = {}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(threads,)) as executor:
+        futures = [
+            executor.submit(
+                forecast_chunk, chunk, args.model_version, args.horizon, args.resolution, args.ensemble
+            )
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            chunk, chunk_errors = future.result()
+            errors.update(chunk_errors)
+            print(f"Finished {len(chunk)} tickers ({len(chunk_errors)} errors)")
+
+    print(json.dumps({
+        "tickers": len(tickers),
+        "errors": errors,
+        "seconds": round(time.time() - started, 1)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Record live market data and broker holdings for the replay providers.
+
+Writes the responses the app would get from Yahoo Finance and SmartAPI into
+REPLAY_DIR, where MARKET_DATA_PROVIDER=replay and BROKER_PROVIDER=replay serve
+them without network access. Symbols that weren't recorded are served
+synthetic data instead.
+
+Usage:
+    python record_replay.py --tickers AAPL MSFT RELIANCE.NS
+    python record_replay.py --holdings --intervals 1d 1h 15m
+"""
+import argparse
+import json
+import os
+import time
+import urllib.parse
+
+from app import config
+from app.services.finance_utils import convert_to_yfinance_symbol
+from app.services.providers import SmartApiBroker, YahooMarketData
+
+# Periods recorded per interval: as much as Yahoo serves
+RECORD_PERIODS = {'1d': 'max', '1h': '730d', '90m': '60d', '30m': '60d', '15m': '60d', '5m': '60d'}
+
+
+def replay_path(*parts):
+    *dirs, filename = parts
+    directory = os.path.join(config.REPLAY_DIR, *dirs)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, urllib.parse.quote(filename, safe=''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', nargs='*', default=[], help="yfinance symbols to record")
+    parser.add_argument('--holdings', action='store_true', help="record the SmartAPI holdings and their symbols")
+    parser.add_argument('--intervals', nargs='+', default=['1d'], choices=list(RECORD_PERIODS))
+    args = parser.parse_args()
+
+    started = time.time()
+    market_data = YahooMarketData()
+
+    tickers = list(args.tickers)
+    if args.holdings:
+        holdings = SmartApiBroker().holding()
+        if not holdings['status']:
+            raise RuntimeError(f"Error fetching holdings: {holdings['message']}")
+        with open(replay_path("holdings.json"), 'w') as f:
+            json.dump(holdings, f, indent=2)
+        tickers += [convert_to_yfinance_symbol(holding['tradingsymbol']) for holding in holdings['data'] or []]
+    tickers = list(dict.fromkeys(tickers))
+
+    errors = {}
+    for symbol in tickers:
+        try:
+            for interval in args.intervals:
+                df = market_data.history(symbol, period=RECORD_PERIODS[interval], interval=interval, repair=True)
+                df.to_csv(replay_path("history", interval, f"{symbol}.csv"))
+            with open(replay_path("info", f"{symbol}.json"), 'w') as f:
+                json.dump(market_data.info(symbol), f, indent=2, default=str)
+            print(f"Recorded {symbol}")
+        except Exception as e:
+            errors[symbol] = str(e)
+
+    print(json.dumps({
+        "tickers": len(tickers),
+        "errors": errors,
+        "directory": config.REPLAY_DIR,
+        "seconds": round(time.time() - started, 1)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
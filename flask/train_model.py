@@ -0,0 +1,74 @@
+"""
+Train a BiLSTM forecasting model and write the files the model registry loads.
+
+Closes of every ticker are differenced, scaled to (-1, 1) and cut into sliding
+windows; the last part of every ticker is held out for validation. A checkpoint
+is saved after every epoch, so an interrupted run continues with --resume.
+
+The output directory receives <name>.pth, scaler_diff.pkl and model_metadata.pkl.
+Copy them into MODEL_DIR and add the version to MODEL_VERSIONS in app/config.py
+to serve the new model.
+
+Usage:
+    python train_model.py --csv AAPL_data.csv --epochs 50
+    python train_model.py --tickers AAPL MSFT RELIANCE.NS --workers 4 --name bilstm_stock_model_v2
+    python train_model.py --tickers AAPL MSFT RELIANCE.NS --workers 4 --name bilstm_stock_model_v2 --resume
+"""
+import argparse
+import json
+import os
+import time
+
+from app import config
+from app.services.training import train_bilstm
+from app.services.training_data import download_closes, load_csv_closes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', nargs='*', default=[], help="tickers to download from yfinance")
+    parser.add_argument('--csv', nargs='*', default=[], help="CSV files with Date and Close columns")
+    parser.add_argument('--name', default="bilstm_stock_model", help="model file name, without extension")
+    parser.add_argument('--output-dir', default=None, help="defaults to DATA_DIR/training/<name>")
+    parser.add_argument('--seq-length', type=int, default=30)
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--val-fraction', type=float, default=0.2)
+    parser.add_argument('--patience', type=int, default=10, help="epochs without improvement before stopping")
+    parser.add_argument('--workers', type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--resume', action='store_true', help="continue from the checkpoint in the output directory")
+    args = parser.parse_args()
+
+    started = time.time()
+
+    history = {os.path.splitext(os.path.basename(path))[0]: load_csv_closes(path) for path in args.csv}
+    if args.tickers:
+        history.update(download_closes(list(dict.fromkeys(args.tickers))))
+    if not history:
+        parser.error("no price history: pass --tickers and/or --csv")
+    print(f"Training {args.name} on {len(history)} tickers ({sum(len(c) for c in history.values())} bars)")
+
+    def progress(epoch, train_loss, val_loss):
+        print(f"Epoch [{epoch + 1}/{args.epochs}], Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f} "
+              f"({time.time() - started:.0f}s)")
+
+    output_dir = args.output_dir or os.path.join(config.DATA_DIR, "training", args.name)
+    result = train_bilstm(
+        list(history.values()), output_dir, model_name=args.name, seq_length=args.seq_length,
+        epochs=args.epochs, batch_size=args.batch_size, learning_rate=args.lr, val_fraction=args.val_fraction,
+        patience=args.patience, num_workers=args.workers, seed=args.seed, resume=args.resume, progress=progress
+    )
+
+    print(json.dumps({
+        "tickers": list(history),
+        "best_val_loss": result["best_val_loss"],
+        "epochs": len(result["history"]["val_loss"]),
+        "files": result["paths"],
+        "seconds": round(time.time() - started, 1)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
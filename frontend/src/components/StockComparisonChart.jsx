@@ -42,7 +42,7 @@ const StockComparisonChart = () => {
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ tickers: [ticker1, ticker2] }),
+        body: JSON.stringify({ tickers: [ticker1, ticker2], resolution: "multi" }),
       });
       
 